@@ -5,7 +5,7 @@ from asgiref.sync import async_to_sync
 from bento_lib.responses import flask_errors
 from bento_lib.service_info.constants import SERVICE_ORGANIZATION_C3G
 from bento_lib.service_info.helpers import build_service_info
-from flask import current_app, Flask, jsonify
+from flask import current_app, Flask
 from flask_cors import CORS
 from werkzeug.exceptions import BadRequest, Forbidden, NotFound
 
@@ -15,7 +15,8 @@ from .config import Config
 from .constants import BENTO_SERVICE_KIND, SERVICE_NAME, SERVICE_TYPE
 from .db import init_db, update_db, close_db
 from .events import close_flask_event_bus
-from .runs import bp_runs
+from .json_provider import PydanticCoreJSONProvider
+from .runs import MIME_JSON, bp_runs
 
 
 application = Flask(__name__)
@@ -23,6 +24,9 @@ application = Flask(__name__)
 # Load configuration from Config class
 application.config.from_object(Config)
 
+# Serialize JSON responses with pydantic-core rather than the standard library json module
+application.json = PydanticCoreJSONProvider(application)
+
 # Set up CORS
 CORS(application, origins=Config.CORS_ORIGINS)
 
@@ -75,27 +79,37 @@ with application.app_context():  # pragma: no cover
         update_db()
 
 
+SERVICE_INFO_EXTENSION_KEY = "bento_wes_service_info"
+
+
+def _build_service_info() -> dict:
+    return async_to_sync(build_service_info)(
+        {
+            "id": current_app.config["SERVICE_ID"],
+            "name": SERVICE_NAME,  # TODO: Should be globally unique?
+            "type": SERVICE_TYPE,
+            "description": "Workflow execution service for a Bento instance.",
+            "organization": SERVICE_ORGANIZATION_C3G,
+            "contactUrl": "mailto:info@c3g.ca",
+            "version": bento_wes.__version__,
+            "bento": {
+                "serviceKind": BENTO_SERVICE_KIND,
+                "gitRepository": "https://github.com/bento-platform/bento_wes",
+            },
+        },
+        debug=current_app.config["BENTO_DEBUG"],
+        local=current_app.config["BENTO_CONTAINER_LOCAL"],
+        logger=current_app.logger,
+    )
+
+
 # TODO: Not compatible with GA4GH WES due to conflict with GA4GH service-info (preferred)
 @application.route("/service-info", methods=["GET"])
 @authz_middleware.deco_public_endpoint
 def service_info():
-    return jsonify(
-        async_to_sync(build_service_info)(
-            {
-                "id": current_app.config["SERVICE_ID"],
-                "name": SERVICE_NAME,  # TODO: Should be globally unique?
-                "type": SERVICE_TYPE,
-                "description": "Workflow execution service for a Bento instance.",
-                "organization": SERVICE_ORGANIZATION_C3G,
-                "contactUrl": "mailto:info@c3g.ca",
-                "version": bento_wes.__version__,
-                "bento": {
-                    "serviceKind": BENTO_SERVICE_KIND,
-                    "gitRepository": "https://github.com/bento-platform/bento_wes",
-                },
-            },
-            debug=current_app.config["BENTO_DEBUG"],
-            local=current_app.config["BENTO_CONTAINER_LOCAL"],
-            logger=current_app.logger,
-        )
-    )
+    # Service info only depends on configuration (and, in debug mode, the Git state of the code when it's first
+    # requested), but is polled frequently - so build and serialize it once per app, and serve the same JSON after that.
+    if (service_info_json := current_app.extensions.get(SERVICE_INFO_EXTENSION_KEY)) is None:
+        service_info_json = current_app.json.dumps(_build_service_info())
+        current_app.extensions[SERVICE_INFO_EXTENSION_KEY] = service_info_json
+    return current_app.response_class(service_info_json, mimetype=MIME_JSON)
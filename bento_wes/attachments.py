@@ -0,0 +1,217 @@
+import io
+import os
+import queue
+import re
+
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+from tempfile import SpooledTemporaryFile
+from typing import IO, Iterator
+from werkzeug.datastructures import FileStorage
+from werkzeug.utils import secure_filename
+
+__all__ = [
+    "DEFAULT_ATTACHMENT_CHUNK_SIZE",
+    "save_workflow_attachment",
+    "save_workflow_attachments",
+]
+
+# Copy workflow attachments to disk 4 MiB at a time when they can't be sendfile'd; configurable via
+# WORKFLOW_ATTACHMENT_CHUNK_SIZE.
+DEFAULT_ATTACHMENT_CHUNK_SIZE = 4 * 1024 * 1024
+
+# Maximum number of attachments to save to disk at once
+MAX_ATTACHMENT_SAVE_WORKERS = 4
+
+# Copy buffers are re-used across attachments (and requests) rather than allocating new bytes for every chunk; keep at
+# most this many idle buffers around.
+MAX_POOLED_BUFFERS = 4
+
+_buffer_pool: queue.SimpleQueue[bytearray] = queue.SimpleQueue()
+
+
+@contextmanager
+def _pooled_buffer(size: int) -> Iterator[memoryview]:
+    try:
+        buf = _buffer_pool.get_nowait()
+        if len(buf) != size:  # Chunk size configuration changed; discard the old buffer
+            buf = bytearray(size)
+    except queue.Empty:
+        buf = bytearray(size)
+
+    try:
+        with memoryview(buf) as mv:
+            yield mv
+    finally:
+        if _buffer_pool.qsize() < MAX_POOLED_BUFFERS:
+            _buffer_pool.put(buf)
+
+
+def _upload_fd(stream: IO[bytes]) -> int | None:
+    """
+    Returns the file descriptor backing an upload stream, if it has one. Werkzeug spools uploads into memory up to a
+    size limit before rolling them over to a temporary file on disk; only the latter has a descriptor.
+    """
+
+    if isinstance(stream, SpooledTemporaryFile) and stream.name is None:
+        # Still in memory (once rolled over to disk, a spooled file has a name); calling fileno() would force it onto
+        # disk, so don't do that - it gets copied via readinto instead.
+        return None
+
+    try:
+        return stream.fileno()
+    except (AttributeError, io.UnsupportedOperation):  # e.g., BytesIO
+        return None
+
+
+def _in_memory_upload(stream: IO[bytes]) -> io.BytesIO | None:
+    """
+    Returns the in-memory buffer holding an upload, if the upload stream is one.
+    """
+    return stream if isinstance(stream, io.BytesIO) else None
+
+
+def _sendfile_all(dst_fd: int, src_fd: int, offset: int) -> bool:
+    """
+    Copies the rest of a file, from offset onwards, to another file with sendfile(2), so the data never has to pass
+    through user space.
+    :return: False (having copied nothing) if this platform can't sendfile between regular files, e.g. macOS, where the
+             destination must be a socket; True otherwise.
+    """
+
+    start = offset
+    remaining = os.fstat(src_fd).st_size - offset
+
+    if hasattr(os, "posix_fadvise"):  # Not available on macOS
+        # The spooled upload is read once, front to back - let the kernel read ahead aggressively
+        os.posix_fadvise(src_fd, offset, 0, os.POSIX_FADV_SEQUENTIAL)
+
+    while remaining > 0:
+        try:
+            sent = os.sendfile(dst_fd, src_fd, offset, remaining)
+        except OSError:
+            if offset == start:  # Nothing copied yet, so the caller can still copy the file some other way
+                return False
+            raise
+        if sent == 0:  # EOF
+            break
+        offset += sent
+        remaining -= sent
+
+    return True
+
+
+def _copy_chunked(src: IO[bytes], dst: IO[bytes], chunk_size: int) -> None:
+    if not hasattr(src, "readinto"):  # Not all file-like objects support readinto
+        while chunk := src.read(chunk_size):
+            dst.write(chunk)
+        return
+
+    with _pooled_buffer(chunk_size) as mv:
+        while n := src.readinto(mv):
+            dst.write(mv[:n])
+
+
+def _max_name_suffix(dest_dir: Path, stem: str, suffix: str) -> int:
+    # Find the highest i out of any existing "<stem> (<i>)<suffix>" files with a single directory scan, rather than
+    # checking i = 1, 2, 3, ... one at a time.
+    pattern = re.compile(rf"{re.escape(stem)} \((\d+)\){re.escape(suffix)}")
+    max_i = 0
+    with os.scandir(dest_dir) as it:
+        for entry in it:
+            if m := pattern.fullmatch(entry.name):
+                max_i = max(max_i, int(m.group(1)))
+    return max_i
+
+
+def _open_unique(dest_dir: Path, name: str) -> tuple[Path, int]:
+    """
+    Creates and opens a new file called name in dest_dir, or - if that name is taken - "<stem> (<i>)<suffix>" for an
+    i higher than any existing one. O_EXCL makes the existence check and creation a single atomic system call, so
+    concurrent saves can never end up with the same file.
+    """
+
+    flags = os.O_WRONLY | os.O_CREAT | os.O_EXCL
+
+    dest = dest_dir / name
+    try:
+        return dest, os.open(dest, flags, 0o644)
+    except FileExistsError:
+        pass
+
+    stem, suffix = os.path.splitext(name)
+    i = _max_name_suffix(dest_dir, stem, suffix) + 1
+    while True:  # Only loops if another save takes the name between the directory scan and the open
+        dest = dest_dir / f"{stem} ({i}){suffix}"
+        try:
+            return dest, os.open(dest, flags, 0o644)
+        except FileExistsError:
+            i += 1
+
+
+def _save_to_dir(attachment: FileStorage, dest_dir: Path, chunk_size: int) -> Path:
+    try:
+        # TODO: Check and fix input if filename is non-secure
+        dest, dst_fd = _open_unique(dest_dir, secure_filename(attachment.filename) or "attachment")
+
+        # The destination file object owns (and closes) the descriptor, whichever way we end up copying
+        with os.fdopen(dst_fd, "wb", buffering=chunk_size) as fh:
+            src_fd = _upload_fd(attachment.stream)
+            # sendfile takes explicit offsets and leaves the upload's own position alone, so if it can't be used on
+            # this platform, the upload can still be copied from its current position below.
+            if src_fd is None or not _sendfile_all(fh.fileno(), src_fd, attachment.stream.tell()):
+                if (src_buf := _in_memory_upload(attachment.stream)) is not None:
+                    # Already entirely in memory, so write it out in one go rather than copying it chunk by chunk
+                    with src_buf.getbuffer() as mv:
+                        fh.write(mv[src_buf.tell():])
+                else:
+                    # Read into a re-used buffer rather than allocating a new bytes object per chunk
+                    _copy_chunked(attachment.stream, fh, chunk_size)
+    finally:
+        # Release the upload's memory/temporary file as soon as it's been saved, instead of when Werkzeug cleans up
+        # the request's files at the end of the request.
+        attachment.close()
+
+    return dest
+
+
+def save_workflow_attachment(
+    attachment: FileStorage,
+    dest_dir: Path,
+    chunk_size: int = DEFAULT_ATTACHMENT_CHUNK_SIZE,
+) -> Path:
+    """
+    Saves a workflow attachment upload into a directory (usually a run directory.) When the upload has been spooled to
+    disk, it is copied with sendfile(2), so the data never passes through Python; if it is in memory, it is written out
+    with a single write. Otherwise, it is streamed to disk in chunks. Existing files are never overwritten; if the
+    attachment's name is taken, a numeric suffix is added.
+    :param attachment: The uploaded attachment
+    :param dest_dir: The directory to save the attachment into
+    :param chunk_size: Buffer size for copying uploads which are neither in memory nor backed by a file on disk
+    :return: The path the attachment was saved to
+    """
+    return _save_to_dir(attachment, dest_dir, chunk_size)
+
+
+def save_workflow_attachments(
+    attachments: list[FileStorage],
+    dest_dir: Path,
+    chunk_size: int = DEFAULT_ATTACHMENT_CHUNK_SIZE,
+    max_workers: int = MAX_ATTACHMENT_SAVE_WORKERS,
+) -> list[Path]:
+    """
+    Saves a list of workflow attachment uploads into a directory, copying up to max_workers of them at once.
+    See save_workflow_attachment.
+    :param attachments: The uploaded attachments
+    :param dest_dir: The directory to save the attachments into
+    :param chunk_size: Buffer size for copying uploads which are neither in memory nor backed by a file on disk
+    :param max_workers: Maximum number of attachments to copy concurrently
+    :return: The paths the attachments were saved to, in the same order as the attachments
+    """
+
+    if len(attachments) <= 1:  # Not worth starting threads for
+        return [_save_to_dir(a, dest_dir, chunk_size) for a in attachments]
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(attachments))) as executor:
+        return list(executor.map(lambda a: _save_to_dir(a, dest_dir, chunk_size), attachments))
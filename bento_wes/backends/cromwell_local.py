@@ -1,5 +1,3 @@
-import re
-
 from flask import current_app, json
 from pathlib import Path
 from typing import TypeVar
@@ -18,9 +16,6 @@ __all__ = [
 
 T = TypeVar("T")
 
-# Spec: https://software.broadinstitute.org/wdl/documentation/spec#whitespace-strings-identifiers-constants
-WDL_WORKSPACE_NAME_REGEX = re.compile(r"workflow\s+([a-zA-Z][a-zA-Z0-9_]+)")
-
 
 class CromwellLocalBackend(WESBackend):
     def _get_supported_types(self) -> tuple[WorkflowType, ...]:
@@ -67,15 +62,14 @@ class CromwellLocalBackend(WESBackend):
 
         cromwell = current_app.config["CROMWELL_LOCATION"]
 
-        # Create workflow options file
+        # Create workflow options file - serialized up front and written in one go, rather than in pieces by json.dump
         options_file = run_dir / "_workflow_options.json"
-        with open(options_file, "w") as of:
-            json.dump({
-                # already namespaced by cromwell ID, so don't need to incorporate run ID into this path:
-                "final_workflow_outputs_dir": str(self.output_dir),
-                "final_workflow_log_dir": str(run_dir / "wf_logs"),
-                "final_call_logs_dir": str(run_dir / "call_logs"),
-            }, of)
+        options_file.write_text(json.dumps({
+            # already namespaced by cromwell ID, so don't need to incorporate run ID into this path:
+            "final_workflow_outputs_dir": str(self.output_dir),
+            "final_workflow_log_dir": str(run_dir / "wf_logs"),
+            "final_call_logs_dir": str(run_dir / "call_logs"),
+        }))
 
         # TODO: Separate cleaning process from run?
         return Command((
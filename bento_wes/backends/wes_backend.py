@@ -1,9 +1,12 @@
+import functools
+import os
 import re
 import shutil
 import subprocess
 import uuid
 
 from abc import ABC, abstractmethod
+from typing import BinaryIO
 from bento_lib.events import EventBus
 from bento_lib.events.types import EVENT_WES_RUN_FINISHED
 from bento_lib.workflows.models import WorkflowSecretInput
@@ -12,6 +15,7 @@ from flask import current_app
 from pathlib import Path
 
 from bento_wes import states
+from bento_wes.cleanup import cleanup_run_dir
 from bento_wes.constants import SERVICE_ARTIFACT
 from bento_wes.db import Database, get_db
 from bento_wes.models import Run, RunWithDetails, RunOutput
@@ -25,10 +29,35 @@ from .exceptions import RunExceptionWithFailState
 __all__ = ["WESBackend"]
 
 # Spec: https://software.broadinstitute.org/wdl/documentation/spec#whitespace-strings-identifiers-constants
-WDL_WORKSPACE_NAME_REGEX = re.compile(r"workflow\s+([a-zA-Z][a-zA-Z0-9_]+)")
+# Bytes pattern, so that workflow files can be searched without decoding them first
+WDL_WORKSPACE_NAME_REGEX = re.compile(rb"workflow\s+([a-zA-Z][a-zA-Z0-9_]+)")
+WDL_IMPORT_REGEX = re.compile(rb"^[ \t]*import\s", re.MULTILINE)
 
 ParamDict = dict[str, str | int | float | bool]
 
+# Only the end of a run's stdout/stderr (usually where any errors are) is read back from its log file and stored, so
+# that memory use while finishing a run - and the size of the run log in the database - stays bounded however much
+# output the run produced.
+RUN_OUTPUT_MAX_BYTES = 4 * 1024 * 1024  # 4 MiB
+
+
+def _read_output_tail(f: BinaryIO, max_bytes: int = RUN_OUTPUT_MAX_BYTES) -> str:
+    size = os.fstat(f.fileno()).st_size
+    # The runner wrote to the file's underlying descriptor, so seek explicitly before reading the output back
+    f.seek(max(size - max_bytes, 0))
+    # A cut-off multibyte character at the start is replaced rather than raising an error
+    tail = f.read(max_bytes).decode("utf-8", errors="replace")
+    if size > max_bytes:
+        return f"[{size - max_bytes} bytes of earlier output omitted]\n{tail}"
+    return tail
+
+
+@functools.cache
+def _get_java_path() -> str | None:
+    # Look Java up on the PATH once per process, rather than starting a JVM (`java -version`) every time WOMtool is run
+    # just to see if Java is installed.
+    return shutil.which("java")
+
 
 class WESBackend(ABC):
     def __init__(
@@ -38,7 +67,7 @@ class WESBackend(ABC):
         workflow_timeout: int,  # Workflow timeout, in seconds
         logger=None,
         event_bus: EventBus | None = None,
-        workflow_host_allow_list: set | None = None,
+        workflow_host_allow_list: frozenset[str] | None = None,
         bento_url: str | None = None,
         validate_ssl: bool = True,
         debug: bool = False,
@@ -176,14 +205,12 @@ class WESBackend(ABC):
         womtool_path = cls.get_womtool_path_or_raise()
 
         # Check for Java (needed to run WOMtool)
-        try:
-            subprocess.run(("java", "-version"))
-        except FileNotFoundError:
+        if (java_path := _get_java_path()) is None:
             raise RunExceptionWithFailState(STATE_SYSTEM_ERROR, "Java is missing (required to validate WDL files)")
 
         # Execute WOMtool command
         return subprocess.Popen(
-            ("java", "-jar", womtool_path, *command),
+            (java_path, "-jar", womtool_path, *command),
             stdout=subprocess.PIPE,
             stderr=subprocess.PIPE,
             encoding="utf-8")
@@ -194,8 +221,18 @@ class WESBackend(ABC):
         :param run: The run whose workflow is being checked
         """
 
+        workflow_path = self.workflow_path(run)
+
+        if not current_app.config["WDL_STRICT_VALIDATION"]:
+            # Cromwell validates the workflow when it runs it, so just check for (unsupported) imports here rather than
+            # starting a JVM to run WOMtool for every run.
+            if WDL_IMPORT_REGEX.search(workflow_path.read_bytes()):
+                raise RunExceptionWithFailState(
+                    STATE_EXECUTOR_ERROR, f"Failed with {STATE_EXECUTOR_ERROR} due to imports in WDL")
+            return
+
         # Validate WDL, listing dependencies:
-        vr = self.execute_womtool_command(("validate", "-l", str(self.workflow_path(run))))
+        vr = self.execute_womtool_command(("validate", "-l", str(workflow_path)))
 
         v_out, v_err = vr.communicate()
 
@@ -245,12 +282,12 @@ class WESBackend(ABC):
         :return: None if the file could not be parsed for some reason; the name string otherwise
         """
 
-        with open(workflow_path, "r") as wdf:
-            wdl_contents = wdf.read()
-            workflow_id_match = WDL_WORKSPACE_NAME_REGEX.search(wdl_contents)
+        # Workflow files are size-limited (see MAX_WORKFLOW_FILE_BYTES), so read them whole - but as bytes, since the
+        # name pattern only matches ASCII anyway.
+        workflow_id_match = WDL_WORKSPACE_NAME_REGEX.search(workflow_path.read_bytes())
 
-            # Invalid/non-workflow-specifying WDL file if false-y
-            return workflow_id_match.group(1) if workflow_id_match else None
+        # Invalid/non-workflow-specifying WDL file if false-y
+        return workflow_id_match.group(1).decode("ascii") if workflow_id_match else None
 
     @abstractmethod
     def _get_command(self, workflow_path: Path, params_path: Path, run_dir: Path) -> Command:
@@ -295,7 +332,8 @@ class WESBackend(ABC):
         # TODO: May want to keep them around for a retry depending on how the retry operation will work.
 
         if not self.debug:
-            shutil.rmtree(self.run_dir(run), ignore_errors=True)
+            # Runs can leave behind a lot of files, so delete them in a separate task rather than holding up this one
+            cleanup_run_dir.delay(run.run_id)
 
     def _initialize_run_and_get_command(
         self,
@@ -345,7 +383,7 @@ class WESBackend(ABC):
             self._check_workflow_and_type(run)
         except RunExceptionWithFailState as e:
             self.log_error(str(e))
-            self._finish_run_and_clean_up(run, e.state)
+            return self._finish_run_and_clean_up(run, e.state)
 
         # -- Find "real" workflow name from workflow file --------------------------------------------------------------
         workflow_name = self.get_workflow_name(self.workflow_path(run))
@@ -354,8 +392,6 @@ class WESBackend(ABC):
             self.log_error("Could not find workflow name in workflow file")
             return self._finish_run_and_clean_up(run, states.STATE_SYSTEM_ERROR)
 
-        self.db.set_run_log_name(run, workflow_name)
-
         # -- Store input for the workflow in a file in the temporary folder --------------------------------------------
         with open(self._params_path(run), "w") as pf:
             pf.write(self._serialize_params(workflow_params_with_secrets))
@@ -363,8 +399,8 @@ class WESBackend(ABC):
         # -- Create the runner command based on inputs -----------------------------------------------------------------
         cmd = self._get_command(self.workflow_path(run), self._params_path(run), self.run_dir(run))
 
-        # -- Update run log with command and Celery ID -----------------------------------------------------------------
-        self.db.set_run_log_command_and_celery_id(run, cmd, celery_id)
+        # -- Update run log with workflow name, command, and Celery ID -------------------------------------------------
+        self.db.set_run_log_name_command_and_celery_id(run, workflow_name, cmd, celery_id)
 
         return cmd, workflow_params_with_secrets
 
@@ -379,35 +415,43 @@ class WESBackend(ABC):
         :param run: The run to execute
         :param cmd: The command used to execute the run
         :param params_with_secrets: A dictionary of parameters, including secret values
-        :return: A ProcessResult tuple of (stdout, stderr, exit_code, timed_out)
+        :return: A ProcessResult tuple of (stdout, stderr, exit_code, timed_out). stdout and stderr are capped to their
+                 last RUN_OUTPUT_MAX_BYTES bytes each.
         """
 
         c = self.db.cursor()
+        run_dir = self.run_dir(run)
 
         # Perform run ==================================================================================================
 
         # -- Start process running the generated command ---------------------------------------------------------------
         #  - Cromwell creates the `cromwell-executions` and `cromwell-workflow-logs` folders in the CWD, so we set the
         #    CWD of the subprocess to our WES temporary directory.
-        runner_process = subprocess.Popen(
-            cmd, cwd=self.tmp_dir, stdout=subprocess.PIPE, stderr=subprocess.PIPE, encoding="utf-8")
-        c.execute("UPDATE runs SET run_log__start_time = ? WHERE id = ?", (iso_now(), run.run_id))
-        self._update_run_state_and_commit(run.run_id, states.STATE_RUNNING)
+        #  - Output goes straight to files in the run directory rather than through pipes, so it doesn't have to be
+        #    drained into memory while the (potentially very long) run is going, and the process can never block on a
+        #    full pipe.
+        with open(run_dir / "stdout.log", "w+b") as stdout_f, open(run_dir / "stderr.log", "w+b") as stderr_f:
+            runner_process = subprocess.Popen(cmd, cwd=self.tmp_dir, stdout=stdout_f, stderr=stderr_f)
+            c.execute("UPDATE runs SET run_log__start_time = ? WHERE id = ?", (iso_now(), run.run_id))
+            self._update_run_state_and_commit(run.run_id, states.STATE_RUNNING)
 
-        # -- Wait for and capture output -------------------------------------------------------------------------------
+            # -- Wait for and capture output ---------------------------------------------------------------------------
 
-        timed_out = False
+            timed_out = False
 
-        try:
-            stdout, stderr = runner_process.communicate(timeout=self._workflow_timeout)
+            try:
+                runner_process.wait(timeout=self._workflow_timeout)
+
+            except subprocess.TimeoutExpired:
+                runner_process.kill()
+                runner_process.wait()
+                timed_out = True
 
-        except subprocess.TimeoutExpired:
-            runner_process.kill()
-            stdout, stderr = runner_process.communicate()
-            timed_out = True
+            finally:
+                exit_code = runner_process.returncode
 
-        finally:
-            exit_code = runner_process.returncode
+            stdout = _read_output_tail(stdout_f)
+            stderr = _read_output_tail(stderr_f)
 
         # -- Censor output in case it includes any secrets -------------------------------------------------------------
 
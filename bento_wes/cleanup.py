@@ -0,0 +1,28 @@
+import shutil
+import uuid
+
+from celery.utils.log import get_task_logger
+from flask import current_app
+
+from .celery import celery
+
+__all__ = [
+    "cleanup_run_dir",
+]
+
+
+@celery.task
+def cleanup_run_dir(run_id: str):
+    """
+    Deletes a run's temporary directory. Large runs can leave behind a lot of intermediate files, so this is done in a
+    Celery task rather than while handling a request.
+    :param run_id: The ID of the run whose directory should be deleted
+    """
+
+    logger = get_task_logger(__name__)
+
+    # Only accept run IDs, rather than arbitrary paths, to avoid ever deleting anything outside the temporary directory
+    run_dir = current_app.config["SERVICE_TEMP"] / str(uuid.UUID(run_id))
+
+    logger.info(f"Cleaning up run directory {run_dir}")
+    shutil.rmtree(run_dir, ignore_errors=True)
@@ -1,6 +1,7 @@
 import os
 from pathlib import Path
 
+from .attachments import DEFAULT_ATTACHMENT_CHUNK_SIZE
 from .constants import SERVICE_ID
 from .logger import logger
 
@@ -59,12 +60,19 @@ class Config:
     SERVICE_ID = SERVICE_ID
     SERVICE_DATA: Path = Path(os.environ.get("SERVICE_DATA", "data"))
     DATABASE: Path = Path(os.environ.get("DATABASE", str(SERVICE_DATA / "bento_wes.db")))
+    # Maximum number of idle database connections kept open (each, for read/write and read-only) per process
+    DATABASE_POOL_SIZE: int = int(os.environ.get("DATABASE_POOL_SIZE", "5"))
     SERVICE_TEMP: Path = Path(os.environ.get("SERVICE_TEMP", "tmp"))
     SERVICE_BASE_URL: str = SERVICE_BASE_URL
 
     # WDL-file-related configuration
     WOM_TOOL_LOCATION: str | None = os.environ.get("WOM_TOOL_LOCATION")
+    # Full WOMtool validation is on by default; it can be turned off to avoid starting an extra JVM for every run
+    WDL_STRICT_VALIDATION: bool = _to_bool(os.environ.get("WDL_STRICT_VALIDATION", "true"))
     WORKFLOW_HOST_ALLOW_LIST: str | None = os.environ.get("WORKFLOW_HOST_ALLOW_LIST")
+    # Buffer size for copying workflow attachments into run directories - default to 4 MiB
+    WORKFLOW_ATTACHMENT_CHUNK_SIZE: int = int(
+        os.environ.get("WORKFLOW_ATTACHMENT_CHUNK_SIZE", str(DEFAULT_ATTACHMENT_CHUNK_SIZE)))
 
     # Backend configuration
     CROMWELL_LOCATION: str = os.environ.get("CROMWELL_LOCATION", "/cromwell.jar")
@@ -93,3 +101,14 @@ class Config:
 
     # Enables interactive debug of Celery tasks locally, not possible with worker threads otherwise
     CELERY_ALWAYS_EAGER: bool = CELERY_DEBUG
+
+    # Bound the number of Redis connections used for publishing tasks (e.g., when runs are submitted) and for results,
+    # so that bursts of run submissions re-use connections rather than opening new ones and exhausting Redis' clients.
+    # (These use Celery's old-style setting names, like the rest of this configuration, which is passed to Celery.)
+    BROKER_POOL_LIMIT: int = int(os.environ.get("CELERY_BROKER_POOL_LIMIT", "10"))
+    BROKER_TRANSPORT_OPTIONS: dict = {"max_connections": 20, "socket_keepalive": True, "health_check_interval": 60}
+    CELERY_RESULT_BACKEND_TRANSPORT_OPTIONS: dict = {"max_connections": 10}
+
+    # Workflow runs are long-lived subprocesses, so a worker process should only reserve the run it is executing;
+    # otherwise, prefetched runs sit behind a multi-hour run on one worker while other workers are idle.
+    CELERYD_PREFETCH_MULTIPLIER: int = 1
@@ -6,6 +6,7 @@ from bento_lib.service_info.helpers import build_bento_service_type
 
 __all__ = [
     "BENTO_SERVICE_KIND",
+    "HTTP_REQUEST_TIMEOUT",
     "SERVICE_ARTIFACT",
     "SERVICE_TYPE",
     "SERVICE_ID",
@@ -17,3 +18,6 @@ SERVICE_ARTIFACT = BENTO_SERVICE_KIND
 SERVICE_TYPE = build_bento_service_type(SERVICE_ARTIFACT, bento_wes.__version__)
 SERVICE_ID = os.environ.get("SERVICE_ID", ":".join(SERVICE_TYPE.values()))
 SERVICE_NAME = "Bento WES"
+
+# (connect, read) timeouts, in seconds, for requests to other services - so that a hung service can't tie up a worker
+HTTP_REQUEST_TIMEOUT = (3.05, 30)
@@ -1,13 +1,17 @@
+import functools
 import logging
-import json
+import os
+import pydantic
 import sqlite3
+import threading
 import uuid
 
 from bento_lib.events import EventBus
 from bento_lib.events.notifications import format_notification
 from bento_lib.events.types import EVENT_CREATE_NOTIFICATION, EVENT_WES_RUN_UPDATED
-from flask import current_app, g
-from typing import Any
+from flask import current_app, g, json
+from pathlib import Path
+from typing import Any, Iterator
 from urllib.parse import urljoin
 
 from . import states
@@ -22,15 +26,81 @@ from .utils import iso_now
 __all__ = [
     "Database",
     "get_db",
+    "get_ro_db",
     "close_db",
     "init_db",
     "update_db",
 ]
 
 
+IN_MEMORY_DATABASE = ":memory:"
+
+# How long (in seconds) to wait for another connection's write lock before giving up with a "database is locked" error
+DB_BUSY_TIMEOUT = 30
+
 NOTIFICATION_WES_RUN_FAILED = "wes_run_failed"
 NOTIFICATION_WES_RUN_COMPLETED = "wes_run_completed"
 
+# Indices are created separately from schema.sql (with IF NOT EXISTS) so that they can also be added to existing
+# databases on startup.
+DB_INDICES = (
+    "CREATE INDEX IF NOT EXISTS runs_state_idx ON runs (state)",
+    "CREATE INDEX IF NOT EXISTS runs_project_dataset_idx ON runs (project_id, dataset_id)",
+    # Task logs are always looked up by run, for run details
+    "CREATE INDEX IF NOT EXISTS task_logs_run_id_idx ON task_logs (run_id)",
+)
+
+# Write-ahead logging lets readers carry on while a run is being written to, and with synchronous=NORMAL, commits only
+# append to the WAL rather than waiting for a sync of the whole database. The journal mode is stored in the database
+# file, so this is a no-op for all but the first connection.
+DB_PRAGMAS = (
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA temp_store = MEMORY",
+)
+
+# Read-only connections are used for the read endpoints, which can be polled frequently; let SQLite serve pages from a
+# memory map of the database file (up to 256 MB) and keep a larger (64 MB) page cache.
+DB_READ_ONLY_PRAGMAS = (
+    "PRAGMA mmap_size = 268435456",
+    "PRAGMA cache_size = -64000",
+)
+
+# Columns needed to build a RunWithDetails. Run stdout/stderr can be very large, so they're only selected when their
+# contents (rather than URLs to them) are being returned.
+RUN_REQUEST_COLUMNS = ", ".join((
+    "request__workflow_params",
+    "request__workflow_type",
+    "request__workflow_type_version",
+    "request__workflow_engine_parameters",
+    "request__workflow_url",
+    "request__tags",
+))
+RUN_DETAILS_COLUMNS = ", ".join((
+    "id",
+    "state",
+    "outputs",
+    RUN_REQUEST_COLUMNS,
+    "run_log__name",
+    "run_log__cmd",
+    "run_log__start_time",
+    "run_log__end_time",
+    "run_log__exit_code",
+))
+RUN_DETAILS_WITH_STREAMS_COLUMNS = f"{RUN_DETAILS_COLUMNS}, run_log__stdout, run_log__stderr"
+
+# Whitelist of stream columns, since the column name has to be formatted into the query
+RUN_STREAM_COLUMNS: dict[RunStream, str] = {
+    "stdout": "run_log__stdout",
+    "stderr": "run_log__stderr",
+}
+
+# Size of chunks read from a stream column when sending it in a response, so that (potentially very large) stream
+# contents are never fully loaded into memory
+RUN_STREAM_CHUNK_SIZE = 64 * 1024
+
+TASK_LOG_COLUMNS = "name, cmd, start_time, end_time, stdout, stderr, exit_code"
+
 
 def run_request_from_row(run: sqlite3.Row) -> RunRequest:
     return RunRequest(
@@ -47,19 +117,23 @@ def _strip_first_slash(string: str) -> str:
     return string[1:] if len(string) > 0 and string[0] == "/" else string
 
 
-def _stream_url(run_id: uuid.UUID | str, stream: RunStream) -> str:
-    return urljoin(current_app.config["SERVICE_BASE_URL"], f"runs/{str(run_id)}/{stream}")
+@functools.lru_cache(maxsize=8)
+def _runs_url_prefix(service_base_url: str) -> str:
+    # Joined once per base URL, rather than twice for every run serialized (once each for stdout and stderr)
+    return urljoin(service_base_url, "runs/")
 
 
 def run_log_from_row(run: sqlite3.Row, stream_content: bool) -> RunLog:
-    run_id = run["id"]
+    # Config is looked up (at most) once per row, and the run's URL shared by both stream URLs. It isn't cached at
+    # module scope, since each app (e.g., in tests) may have its own SERVICE_BASE_URL.
+    run_url = "" if stream_content else f"{_runs_url_prefix(current_app.config['SERVICE_BASE_URL'])}{run['id']}/"
     return RunLog(
         name=run["run_log__name"],
         cmd=run["run_log__cmd"],
         start_time=run["run_log__start_time"] or None,
         end_time=run["run_log__end_time"] or None,
-        stdout=run["run_log__stdout"] if stream_content else _stream_url(run_id, "stdout"),
-        stderr=run["run_log__stderr"] if stream_content else _stream_url(run_id, "stderr"),
+        stdout=run["run_log__stdout"] if stream_content else f"{run_url}stdout",
+        stderr=run["run_log__stderr"] if stream_content else f"{run_url}stderr",
         exit_code=run["run_log__exit_code"],
     )
 
@@ -82,8 +156,27 @@ def run_from_row(run: sqlite3.Row) -> Run:
 
 class Database:
 
-    def __init__(self):
-        self._conn = sqlite3.connect(current_app.config["DATABASE"], detect_types=sqlite3.PARSE_DECLTYPES)
+    def __init__(self, read_only: bool = False):
+        self.read_only: bool = read_only
+        self.path: str = str(current_app.config["DATABASE"])
+
+        # No columns are declared with a type that sqlite3 has converters for, so don't ask it to look for any
+        # (detect_types) when reading rows.
+        # Pooled connections may be picked up by a different thread than the one which created them (but are only
+        # ever used by one thread at a time), so turn off sqlite3's same-thread check.
+        if read_only:
+            self._conn = sqlite3.connect(
+                f"{Path(self.path).absolute().as_uri()}?mode=ro",
+                timeout=DB_BUSY_TIMEOUT,
+                check_same_thread=False,
+                uri=True,
+            )
+            for pragma in DB_READ_ONLY_PRAGMAS:
+                self._conn.execute(pragma)
+        else:
+            self._conn = sqlite3.connect(self.path, timeout=DB_BUSY_TIMEOUT, check_same_thread=False)
+            for pragma in DB_PRAGMAS:
+                self._conn.execute(pragma)
         self._conn.row_factory = sqlite3.Row
 
     def cursor(self):
@@ -92,6 +185,9 @@ class Database:
     def commit(self):
         self._conn.commit()
 
+    def rollback(self):
+        self._conn.rollback()
+
     def close(self):
         self._conn.close()
 
@@ -99,6 +195,38 @@ class Database:
         with current_app.open_resource("schema.sql") as sf:
             self.cursor().executescript(sf.read().decode("utf-8"))
 
+        self.create_indices()
+        self.commit()
+
+    def create_indices(self):
+        c = self.cursor()
+        for index_sql in DB_INDICES:
+            c.execute(index_sql)
+
+    def migrate(self):
+        c = self.cursor()
+        run_columns: set[str] = {col["name"] for col in c.execute("PRAGMA table_info(runs)").fetchall()}
+
+        if "workflow_id" not in run_columns:
+            # Project/dataset/workflow IDs were lifted out of the request JSON into their own columns; add them and
+            # back-fill them for any existing runs.
+            for col in ("project_id", "dataset_id", "workflow_id"):
+                c.execute(f"ALTER TABLE runs ADD COLUMN {col} TEXT DEFAULT NULL")
+
+            back_fill: list[tuple[str | None, str | None, str, str]] = []
+            for r in c.execute("SELECT * FROM runs").fetchall():
+                try:
+                    run_req = run_request_from_row(r)
+                    # Can also raise ValueError, e.g. for a project-dataset input value without a colon
+                    project_and_dataset = run_req.get_project_and_dataset()
+                except (pydantic.ValidationError, ValueError) as e:
+                    # Leave this run's new columns NULL, rather than failing the migration (and app startup) entirely
+                    current_app.logger.error(f"Could not back-fill IDs for run {r['id']}: invalid run request ({e})")
+                    continue
+                back_fill.append((*project_and_dataset, run_req.tags.workflow_id, r["id"]))
+
+            c.executemany("UPDATE runs SET project_id = ?, dataset_id = ?, workflow_id = ? WHERE id = ?", back_fill)
+
         self.commit()
 
     def finish_run(
@@ -170,7 +298,7 @@ class Database:
         stuck_run_ids: list[sqlite3.Row] = c.fetchall()
 
         for r in stuck_run_ids:
-            run = self.get_run_with_details(c, r["id"], stream_content=True)
+            run = self.get_run(c, r["id"])
             if run is None:
                 logger.error(f"Missing run: {r['id']}")
                 continue
@@ -183,32 +311,54 @@ class Database:
 
     @staticmethod
     def get_task_logs(c: sqlite3.Cursor, run_id: uuid.UUID | str) -> list:
-        c.execute("SELECT * FROM task_logs WHERE run_id = ?", (str(run_id),))
+        c.execute(f"SELECT {TASK_LOG_COLUMNS} FROM task_logs WHERE run_id = ?", (str(run_id),))
         return [task_log_dict(task_log) for task_log in c.fetchall()]
 
+    @staticmethod
+    def get_task_logs_for_runs(c: sqlite3.Cursor, run_ids: list[str]) -> dict[str, list]:
+        """
+        Fetches task logs for several runs at once, with a single query rather than one per run.
+        :param c: An SQLite connection cursor
+        :param run_ids: IDs of the runs to fetch task logs for
+        :return: A dictionary of run ID: list of task logs, with an entry for every run ID passed
+        """
+        task_logs: dict[str, list] = {run_id: [] for run_id in run_ids}
+        if run_ids:
+            c.execute(
+                f"SELECT run_id, {TASK_LOG_COLUMNS} FROM task_logs WHERE run_id IN ({', '.join('?' * len(run_ids))})",
+                run_ids)
+            for task_log in c.fetchall():
+                task_logs[task_log["run_id"]].append(task_log_dict(task_log))
+        return task_logs
+
     @classmethod
     def run_with_details_from_row(
         cls,
         c: sqlite3.Cursor,
         run: sqlite3.Row,
         stream_content: bool,
+        task_logs: list | None = None,
     ) -> RunWithDetails:
+        """
+        Builds a RunWithDetails from a runs table row. Task logs are fetched for the run unless they are passed in
+        (e.g., when they have been fetched for a batch of runs with get_task_logs_for_runs.)
+        """
         return RunWithDetails.model_validate(dict(
             run_id=run["id"],
             state=run["state"],
             request=run_request_from_row(run),
             run_log=run_log_from_row(run, stream_content),
-            task_logs=cls.get_task_logs(c, run["id"]),
+            task_logs=cls.get_task_logs(c, run["id"]) if task_logs is None else task_logs,
             outputs=json.loads(run["outputs"]),
         ))
 
     @staticmethod
-    def _get_run_row(c: sqlite3.Cursor, run_id: uuid.UUID | str) -> sqlite3.Row | None:
-        return c.execute("SELECT * FROM runs WHERE id = ?", (str(run_id),)).fetchone()
+    def _get_run_row(c: sqlite3.Cursor, run_id: uuid.UUID | str, columns: str) -> sqlite3.Row | None:
+        return c.execute(f"SELECT {columns} FROM runs WHERE id = ?", (str(run_id),)).fetchone()
 
     @classmethod
     def get_run(cls, c: sqlite3.Cursor, run_id: uuid.UUID | str) -> Run | None:
-        if run := cls._get_run_row(c, run_id):
+        if run := cls._get_run_row(c, run_id, "id, state"):
             return run_from_row(run)
         return None
 
@@ -219,19 +369,78 @@ class Database:
         run_id: uuid.UUID | str,
         stream_content: bool,
     ) -> RunWithDetails | None:
-        if run := cls._get_run_row(c, run_id):
+        columns = RUN_DETAILS_WITH_STREAMS_COLUMNS if stream_content else RUN_DETAILS_COLUMNS
+        if run := cls._get_run_row(c, run_id, columns):
             return cls.run_with_details_from_row(c, run, stream_content)
         return None
 
-    def set_run_log_name(self, run: Run, workflow_name: str):
-        # TODO: To avoid having multiple names, we should maybe only set this once?
-        self.cursor().execute("UPDATE runs SET run_log__name = ? WHERE id = ?", (workflow_name, run.run_id))
-        self.commit()
+    @classmethod
+    def get_run_and_request(cls, c: sqlite3.Cursor, run_id: uuid.UUID | str) -> tuple[Run, RunRequest] | None:
+        """
+        Fetches a run's state and request (for checking permissions), without loading its run log, task logs, or
+        outputs.
+        :param c: An SQLite connection cursor
+        :param run_id: The ID of the run to fetch
+        :return: A tuple of (run, run request), or None if the run does not exist
+        """
+        if run := cls._get_run_row(c, run_id, f"id, state, {RUN_REQUEST_COLUMNS}"):
+            return run_from_row(run), run_request_from_row(run)
+        return None
 
-    def set_run_log_command_and_celery_id(self, run: Run, cmd: Command, celery_id: int):
+    @classmethod
+    def get_run_request_and_celery_id(
+        cls,
+        c: sqlite3.Cursor,
+        run_id: uuid.UUID | str,
+    ) -> tuple[Run, RunRequest, str | None] | None:
+        """
+        Fetches a run's state, request (for checking permissions), and the ID of the Celery task executing it (for
+        cancelling the run), without loading any of the run's other details.
+        :param c: An SQLite connection cursor
+        :param run_id: The ID of the run to fetch
+        :return: A tuple of (run, run request, Celery task ID or None), or None if the run does not exist
+        """
+        if run := cls._get_run_row(c, run_id, f"id, state, {RUN_REQUEST_COLUMNS}, run_log__celery_id"):
+            return run_from_row(run), run_request_from_row(run), run["run_log__celery_id"]
+        return None
+
+    @classmethod
+    def get_run_and_rowid(cls, c: sqlite3.Cursor, run_id: uuid.UUID | str) -> tuple[Run, RunRequest, int] | None:
+        """
+        Fetches a run's state and request (for checking permissions) along with its row ID, which can then be used to
+        read one of its output streams with iter_run_stream, without loading any of the run's other details.
+        :param c: An SQLite connection cursor
+        :param run_id: The ID of the run to fetch
+        :return: A tuple of (run, run request, row ID), or None if the run does not exist
+        """
+        if run := cls._get_run_row(c, run_id, f"rowid, id, state, {RUN_REQUEST_COLUMNS}"):
+            return run_from_row(run), run_request_from_row(run), run["rowid"]
+        return None
+
+    def iter_run_stream(self, rowid: int, stream: RunStream) -> Iterator[bytes]:
+        """
+        Reads the contents of one of a run's output streams in chunks of (UTF-8-encoded) bytes, so that the whole
+        stream never has to be held in memory at once.
+        :param rowid: The row ID of the run, as returned by get_run_and_rowid
+        :param stream: The stream to read the contents of
+        """
+        stream_column = RUN_STREAM_COLUMNS[stream]
+
+        if not hasattr(self._conn, "blobopen"):  # Incremental I/O requires Python 3.11+; read it all at once otherwise
+            row = self._conn.execute(f"SELECT {stream_column} FROM runs WHERE rowid = ?", (rowid,)).fetchone()
+            if row is not None and row[0]:
+                yield row[0].encode("utf-8")
+            return
+
+        with self._conn.blobopen("runs", stream_column, rowid, readonly=True) as blob:
+            while chunk := blob.read(RUN_STREAM_CHUNK_SIZE):
+                yield chunk
+
+    def set_run_log_name_command_and_celery_id(self, run: Run, workflow_name: str, cmd: Command, celery_id: int):
+        # Set together, in one statement and one commit, since they're all known once the run has been initialized
         self.cursor().execute(
-            "UPDATE runs SET run_log__cmd = ?, run_log__celery_id = ? WHERE id = ?",
-            (" ".join(cmd), celery_id, run.run_id))
+            "UPDATE runs SET run_log__name = ?, run_log__cmd = ?, run_log__celery_id = ? WHERE id = ?",
+            (workflow_name, " ".join(cmd), celery_id, run.run_id))
         self.commit()
 
     @staticmethod
@@ -249,7 +458,14 @@ class Database:
     ):
         if logger:
             logger.info(f"Updating run state of {run_id} to {state}")
-        c.execute("UPDATE runs SET state = ? WHERE id = ?", (state, str(run_id)))
+
+        had_pending_writes = self._conn.in_transaction
+        c.execute("UPDATE runs SET state = ? WHERE id = ? AND state != ?", (state, str(run_id), state))
+        if c.rowcount == 0 and not had_pending_writes:
+            # Already in this state, and nothing else to commit - skip the commit and the (redundant) update event
+            self._conn.rollback()
+            return
+
         self.commit()
         if event_bus and publish_event:
             event_bus.publish_service_event(
@@ -259,17 +475,85 @@ class Database:
             )
 
 
+class _DatabasePool:
+    """
+    Process-wide pool of idle database connections, so that each request (or task) doesn't have to open the database
+    file (along with its WAL and shared memory files) and re-run connection pragmas. Connections are handed out for the
+    lifetime of an app context and returned by close_db. In-memory databases are never pooled, since each connection to
+    one is a separate database.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pid: int = os.getpid()
+        self._idle: dict[tuple[str, bool], list[Database]] = {}
+
+    def _check_pid(self) -> None:
+        # Connections must not be shared with a forked process (e.g., pre-forked web or Celery workers), so forget
+        # (without closing, since the parent is still using them) any inherited from the parent.
+        if (pid := os.getpid()) != self._pid:
+            self._pid = pid
+            self._idle = {}
+
+    def acquire(self, read_only: bool) -> Database:
+        key = (str(current_app.config["DATABASE"]), read_only)
+        if key[0] != IN_MEMORY_DATABASE:
+            with self._lock:
+                self._check_pid()
+                if idle := self._idle.get(key):
+                    return idle.pop()
+        return Database(read_only=read_only)
+
+    def release(self, db: Database) -> None:
+        key = (db.path, db.read_only)
+
+        if key[0] != IN_MEMORY_DATABASE:
+            try:
+                db.rollback()  # Don't hand out a connection in the middle of a transaction
+            except sqlite3.Error:
+                pass
+            else:
+                with self._lock:
+                    self._check_pid()
+                    idle = self._idle.setdefault(key, [])
+                    if len(idle) < current_app.config["DATABASE_POOL_SIZE"]:
+                        idle.append(db)
+                        return
+
+        db.close()
+
+
+_pool = _DatabasePool()
+
+
 def get_db() -> Database:
     if "db" not in g:
-        g.db = Database()
+        g.db = _pool.acquire(read_only=False)
 
     return g.db
 
 
+def get_ro_db() -> Database:
+    """
+    Returns a read-only database connection for endpoints which never write. These connections never take the write
+    lock, and are tuned for reads (see DB_READ_ONLY_PRAGMAS). In-memory databases cannot be shared between connections,
+    so in that case this is the same as get_db().
+    """
+
+    if str(current_app.config["DATABASE"]) == IN_MEMORY_DATABASE:
+        return get_db()
+
+    if "ro_db" not in g:
+        g.ro_db = _pool.acquire(read_only=True)
+
+    return g.ro_db
+
+
 def close_db(_e=None):
-    db: Database | None = g.pop("db", None)
-    if db is not None:
-        db.close()
+    for key in ("db", "ro_db"):
+        db: Database | None = g.pop(key, None)
+        if db is not None:
+            _pool.release(db)
 
 
 def init_db():
@@ -286,6 +570,10 @@ def update_db():
         init_db()
         return
 
+    db.migrate()
     db.update_stuck_runs()
 
-    # TODO: Migrations if needed
+    db.create_indices()
+    # Refresh the query planner's statistics, so that it knows which indices are worth using on the existing data
+    c.execute("ANALYZE")
+    db.commit()
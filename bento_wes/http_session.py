@@ -0,0 +1,55 @@
+import atexit
+import http.cookiejar
+import requests
+import threading
+
+from requests.adapters import HTTPAdapter
+from urllib3.util import Retry
+
+__all__ = [
+    "get_http_session",
+]
+
+# Retries transient failures (connection errors, gateway errors) of idempotent requests (i.e., not token POSTs), and
+# returns the last response rather than raising if it's still an error, so callers handle it as they would any other bad
+# status. Read timeouts are not retried: a server which has hung would otherwise tie up the request (and the thread or
+# worker handling it) for several full timeouts.
+HTTP_SESSION_RETRY = Retry(
+    total=3, read=0, backoff_factor=0.3, status_forcelist=(502, 503, 504), raise_on_status=False)
+
+_session: requests.Session | None = None
+_session_lock = threading.Lock()
+
+
+def _close_http_session() -> None:
+    global _session
+    if _session is not None:
+        _session.close()
+        _session = None
+
+
+def get_http_session() -> requests.Session:
+    """
+    Returns a requests session shared by everything in this process which makes HTTP requests (service registry,
+    OpenID provider, workflow downloads), so that connections are kept alive and re-used rather than re-established (DNS
+    lookup, TCP + TLS handshakes) for every request. Created on first use, so that forked worker processes never share a
+    connection pool with their parent.
+    """
+
+    global _session
+
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                # Never keep cookies: the session is shared between requests made on behalf of different users (e.g.,
+                # workflow downloads with a forwarded Authorization header), so a cookie set in response to one must
+                # not be sent with another - just like the stateless requests.get calls this replaces.
+                session.cookies.set_policy(http.cookiejar.DefaultCookiePolicy(allowed_domains=[]))
+                adapter = HTTPAdapter(pool_connections=4, pool_maxsize=20, max_retries=HTTP_SESSION_RETRY)
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                _session = session
+                atexit.register(_close_http_session)
+
+    return _session
@@ -0,0 +1,53 @@
+import pydantic_core
+
+from flask.json.provider import DefaultJSONProvider
+from typing import Any
+
+__all__ = [
+    "PydanticCoreJSONProvider",
+]
+
+
+# Arguments pydantic-core can handle itself; anything else (e.g. sort_keys=True) goes through the standard library.
+COMPACT_SEPARATORS = (",", ":")
+INDENT_SEPARATORS = (",", ": ")
+PYDANTIC_CORE_DUMPS_KWARGS = frozenset({"default", "ensure_ascii", "indent", "separators", "sort_keys"})
+
+
+class PydanticCoreJSONProvider(DefaultJSONProvider):
+    """
+    Flask JSON provider which uses pydantic-core's Rust JSON serializer rather than the standard library json module.
+    pydantic-core is already installed as a dependency of pydantic, and natively handles datetimes, UUIDs, sets, and
+    pydantic models; anything else falls back to the given default (or Flask's default conversions).
+
+    Unlike Flask's default provider, keys are not sorted, non-ASCII characters are not escaped, and datetimes are
+    rendered as ISO 8601 strings rather than HTTP dates. Calls asking for sorted keys, ASCII-only output, or other
+    separators are handed to the standard library json module instead, with values converted the same way.
+    """
+
+    sort_keys = False
+    ensure_ascii = False
+
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        kwargs.setdefault("default", self.default)
+        kwargs.setdefault("ensure_ascii", self.ensure_ascii)
+        kwargs.setdefault("sort_keys", self.sort_keys)
+
+        indent = kwargs.get("indent")
+        separators = COMPACT_SEPARATORS if indent is None else INDENT_SEPARATORS
+
+        if (
+            kwargs.keys() - PYDANTIC_CORE_DUMPS_KWARGS
+            or kwargs["sort_keys"]
+            or kwargs["ensure_ascii"]
+            or kwargs.get("separators", separators) != separators
+        ):
+            # Convert values the same way pydantic-core would, so datetimes etc. look the same either way
+            default = kwargs["default"]
+            return super().dumps(
+                obj, **{**kwargs, "default": lambda o: pydantic_core.to_jsonable_python(o, fallback=default)})
+
+        return pydantic_core.to_json(obj, indent=indent, fallback=kwargs["default"]).decode("utf-8")
+
+    def loads(self, s: str | bytes, **kwargs: Any) -> Any:
+        return pydantic_core.from_json(s)
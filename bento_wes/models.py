@@ -1,4 +1,5 @@
-from bento_lib.workflows.models import WorkflowDefinition
+from bento_lib.workflows.models import WorkflowDefinition, WorkflowProjectDatasetInput
+from bento_lib.workflows.utils import namespaced_input
 from datetime import datetime
 from pydantic import BaseModel, ConfigDict, AnyUrl, Json
 from typing import Literal
@@ -10,6 +11,7 @@ __all__ = [
     "Run",
     "RunWithDetails",
     "RunOutput",
+    "PublicRunWithDetails",
 ]
 
 
@@ -28,6 +30,20 @@ class RunRequest(BaseModel):
     workflow_url: AnyUrl
     tags: Json[BentoRunRequestTags]
 
+    def get_project_and_dataset(self) -> tuple[str, str] | tuple[None, None]:
+        """
+        Gets the project and dataset IDs the run request targets, if the workflow has a (single) project-dataset input.
+        :return: A tuple of (project ID, dataset ID), or (None, None) if the run request isn't project/dataset-specific
+        """
+        wm = self.tags.workflow_metadata
+        project_dataset_inputs = [i for i in wm.inputs if isinstance(i, WorkflowProjectDatasetInput)]
+        if len(project_dataset_inputs) == 1:
+            inp = project_dataset_inputs[0]
+            if inp_val := self.workflow_params.get(namespaced_input(self.tags.workflow_id, inp.id)):
+                project, dataset = inp_val.split(":")
+                return project, dataset
+        return None, None
+
 
 class RunLog(BaseModel):
     name: str
@@ -55,3 +71,35 @@ class RunWithDetails(Run):
     run_log: RunLog
     task_logs: list[dict]  # TODO: model
     outputs: dict[str, RunOutput]
+
+
+# Public projections of run details (Bento-specific); these only contain the fields which can be shown publicly for
+# completed runs. Build them from a RunWithDetails with model_validate(..., from_attributes=True).
+
+
+class PublicWorkflowMetadata(BaseModel):
+    data_type: str | None
+
+
+class PublicRunRequestTags(BaseModel):
+    workflow_id: str
+    workflow_metadata: PublicWorkflowMetadata
+    # Not part of BentoRunRequestTags, but included if a client set them as extra tags. Dump public details with
+    # exclude_unset=True to leave these out otherwise.
+    project_id: str | None = None
+    dataset_id: str | None = None
+
+
+class PublicRunRequest(BaseModel):
+    workflow_type: Literal["WDL"]
+    tags: PublicRunRequestTags
+
+
+class PublicRunLog(BaseModel):
+    start_time: datetime | None
+    end_time: datetime | None
+
+
+class PublicRunWithDetails(Run):
+    request: PublicRunRequest
+    run_log: PublicRunLog
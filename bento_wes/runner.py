@@ -1,4 +1,3 @@
-import requests
 import uuid
 
 from celery.utils.log import get_task_logger
@@ -8,8 +7,10 @@ from . import states
 from .backends.cromwell_local import CromwellLocalBackend
 from .backends.wes_backend import WESBackend
 from .celery import celery
+from .constants import HTTP_REQUEST_TIMEOUT
 from .db import Database, get_db
 from .events import get_new_event_bus
+from .http_session import get_http_session
 from .workflows import parse_workflow_host_allow_list
 
 
@@ -66,12 +67,14 @@ def run_workflow(self, run_id: uuid.UUID):
             #  - perhaps exchange the user's token for some type of limited-scope token (ingest only) which lasts
             #    48 hours, given out by the authorization service?
 
-            openid_config = requests.get(current_app.config["BENTO_OPENID_CONFIG_URL"], verify=validate_ssl).json()
-            token_res = requests.post(openid_config["token_endpoint"], verify=validate_ssl, data={
+            session = get_http_session()
+            openid_config = session.get(
+                current_app.config["BENTO_OPENID_CONFIG_URL"], verify=validate_ssl, timeout=HTTP_REQUEST_TIMEOUT).json()
+            token_res = session.post(openid_config["token_endpoint"], verify=validate_ssl, data={
                 "grant_type": "client_credentials",
                 "client_id": client_id,
                 "client_secret": client_secret,
-            })
+            }, timeout=HTTP_REQUEST_TIMEOUT)
             secrets["access_token"] = token_res.json()["access_token"]
         else:
             logger.warning(
@@ -1,38 +1,41 @@
 import itertools
-import json
-import os
 import sqlite3
 import pydantic
 import requests
 import shutil
+import threading
 import traceback
 import urllib.parse
 import uuid
 
 from bento_lib.auth.permissions import P_INGEST_DATA, P_VIEW_RUNS
 from bento_lib.auth.resources import RESOURCE_EVERYTHING, build_resource
-from bento_lib.workflows.models import WorkflowProjectDatasetInput, WorkflowConfigInput, WorkflowServiceUrlInput
+from bento_lib.workflows.models import WorkflowConfigInput, WorkflowServiceUrlInput
 from bento_lib.workflows.utils import namespaced_input
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from bento_lib.responses.flask_errors import (
     flask_bad_request_error,
     flask_internal_server_error,
     flask_not_found_error,
     flask_forbidden_error,
 )
-from flask import Blueprint, Request, Response, current_app, jsonify, request
+from flask import Blueprint, Request, Response, current_app, json, jsonify, request, stream_with_context
 from pathlib import Path
-from typing import Any, Callable, Iterator
-from werkzeug.utils import secure_filename
+from typing import Any, Iterator
+from werkzeug.datastructures import MultiDict
 
 from . import states
+from .attachments import save_workflow_attachments
 from .authz import authz_middleware
 from .celery import celery
-from .db import Database, get_db
+from .cleanup import cleanup_run_dir
+from .db import RUN_DETAILS_COLUMNS, Database, get_db, get_ro_db
 from .events import get_flask_event_bus
 from .logger import logger
-from .models import RunRequest
+from .models import PublicRunWithDetails, RunRequest, RunWithDetails
 from .runner import run_workflow
-from .service_registry import get_bento_services
+from .service_registry import get_bento_service_url
 from .states import STATE_COMPLETE
 from .types import RunStream
 from .workflows import (
@@ -43,44 +46,45 @@ from .workflows import (
     parse_workflow_host_allow_list,
 )
 
+MIME_JSON = "application/json"
 MIME_OCTET_STREAM = "application/octet-stream"
 CHUNK_SIZE = 1024 * 16  # Read 16 KB at a time
+RUN_LIST_BATCH_SIZE = 100  # Number of runs to load at a time when listing runs
 
-bp_runs = Blueprint("runs", __name__)
+# Columns which determine a run's authz resource (see _get_resource_for_run_request), for checking permissions in SQL
+RUN_DATA_TYPE_SQL = "json_extract(request__tags, '$.workflow_metadata.data_type')"
+RUN_RESOURCE_COLUMNS = f"project_id, dataset_id, {RUN_DATA_TYPE_SQL}"
 
+WORKFLOW_MANAGER_EXTENSION_KEY = "bento_wes_workflow_manager"
 
-def _get_resource_for_run_request(run_req: RunRequest) -> dict:
-    wi = run_req.tags.workflow_id
-    wm = run_req.tags.workflow_metadata
+# Once a run has terminated, its status never changes again, so it is cached (along with the resource used to check
+# permissions) for clients which keep polling it, rather than being read from the database each time.
+RUN_STATUS_CACHE_MAX_ENTRIES = 4096
+_terminated_run_statuses: OrderedDict[str, tuple[dict, str]] = OrderedDict()
+_terminated_run_statuses_lock = threading.Lock()
 
-    resource = RESOURCE_EVERYTHING
+bp_runs = Blueprint("runs", __name__)
 
-    project_dataset_inputs = [i for i in wm.inputs if isinstance(i, WorkflowProjectDatasetInput)]
-    if len(project_dataset_inputs) == 1:
-        inp = project_dataset_inputs[0]
-        if inp_val := run_req.workflow_params.get(namespaced_input(wi, inp.id)):
-            project, dataset = inp_val.split(":")
-            resource = build_resource(project, dataset, data_type=wm.data_type)
 
-    return resource
+def _get_resource_for_run_request(run_req: RunRequest) -> dict:
+    project, dataset = run_req.get_project_and_dataset()
+    if project is None:
+        return RESOURCE_EVERYTHING
+    return build_resource(project, dataset, data_type=run_req.tags.workflow_metadata.data_type)
 
 
 def authz_enabled() -> bool:
     return current_app.config["AUTHZ_ENABLED"]
 
 
-def _check_runs_permission(run_requests: list[RunRequest], permission: str) -> Iterator[bool]:
+def _check_resources_permission(resources: list[dict], permission: str) -> Iterator[bool]:
     if not authz_enabled():
-        yield from [True] * len(run_requests)  # Assume we have permission for everything if authz disabled
+        yield from [True] * len(resources)  # Assume we have permission for everything if authz disabled
         return
 
     # /policy/evaluate returns a matrix of booleans of row: resource, col: permission. Thus, we can
     # return permission booleans by resource by flattening it, since there is only one column.
-    yield from (r[0] for r in authz_middleware.evaluate(
-        request,
-        [_get_resource_for_run_request(run_request) for run_request in run_requests],
-        [permission],
-    ))
+    yield from (r[0] for r in authz_middleware.evaluate(request, resources, [permission]))
 
 
 def _post_headers_getter(r: Request) -> dict[str, str]:
@@ -88,17 +92,21 @@ def _post_headers_getter(r: Request) -> dict[str, str]:
     return {"Authorization": f"Bearer {token}"} if token else {}
 
 
-def _check_single_run_permission_and_mark(run_req: RunRequest, permission: str, form_mode: bool = False) -> bool:
+def _check_single_resource_permission_and_mark(resource: dict, permission: str, form_mode: bool = False) -> bool:
     # By calling this, the developer indicates that they will have handled permissions adequately:
     return authz_middleware.evaluate_one(
         request,
-        _get_resource_for_run_request(run_req),
+        resource,
         permission,
         headers_getter=_post_headers_getter if form_mode else None,
         mark_authz_done=True,
     ) if authz_enabled() else True
 
 
+def _check_single_run_permission_and_mark(run_req: RunRequest, permission: str, form_mode: bool = False) -> bool:
+    return _check_single_resource_permission_and_mark(_get_resource_for_run_request(run_req), permission, form_mode)
+
+
 def _config_for_run(run_dir: Path) -> dict[str, str | bool | None]:
     return {
         # In production, workflows should validate SSL (i.e., omit the curl -k flag).
@@ -122,8 +130,39 @@ def _config_for_run(run_dir: Path) -> dict[str, str | bool | None]:
     }
 
 
+def _get_workflow_manager() -> WorkflowManager:
+    # The workflow manager only depends on app configuration, so create it once per app rather than once per request.
+    if (wm := current_app.extensions.get(WORKFLOW_MANAGER_EXTENSION_KEY)) is None:
+        wm = current_app.extensions[WORKFLOW_MANAGER_EXTENSION_KEY] = WorkflowManager(
+            current_app.config["SERVICE_TEMP"],
+            service_base_url=current_app.config["SERVICE_BASE_URL"],
+            bento_url=current_app.config["BENTO_URL"],
+            logger=logger,
+            # Get list of allowed workflow hosts from configuration for any checks inside the runner
+            # If it's blank, assume that means "any host is allowed" and pass None to the runner
+            workflow_host_allow_list=parse_workflow_host_allow_list(current_app.config["WORKFLOW_HOST_ALLOW_LIST"]),
+            validate_ssl=current_app.config["BENTO_VALIDATE_SSL"],
+            debug=current_app.config["BENTO_DEBUG"],
+        )
+    return wm
+
+
+RUN_REQUEST_FORM_FIELDS = frozenset(RunRequest.model_fields)
+
+
+def _run_request_from_form(form: MultiDict[str, str]) -> RunRequest:
+    # Only pass the (single-valued) fields RunRequest declares to pydantic, rather than copying the whole form
+    return RunRequest.model_validate({k: v for k in RunRequest.model_fields if (v := form.get(k)) is not None})
+
+
 def _create_run(db: Database, c: sqlite3.Cursor) -> Response:
-    run_req = RunRequest.model_validate(request.form.to_dict())
+    # Check for missing fields up front, so that the error can name them
+    if missing_fields := RUN_REQUEST_FORM_FIELDS.difference(request.form.keys()):
+        authz_middleware.mark_authz_done(request)
+        return flask_bad_request_error(
+            f"Validation error: missing run request fields: {', '.join(sorted(missing_fields))}")
+
+    run_req = _run_request_from_form(request.form)
 
     # Check ingest permissions before continuing
 
@@ -138,65 +177,71 @@ def _create_run(db: Database, c: sqlite3.Cursor) -> Response:
     #  - workflow_url can refer to an attachment
     workflow_attachment_list = request.files.getlist("workflow_attachment")
 
-    # Get list of allowed workflow hosts from configuration for any checks inside the runner
-    # If it's blank, assume that means "any host is allowed" and pass None to the runner
-    workflow_host_allow_list = parse_workflow_host_allow_list(current_app.config["WORKFLOW_HOST_ALLOW_LIST"])
-
     # Download workflow file, potentially using passed auth headers if they're present
     # and we're querying our own node.
 
     # TODO: Move this back to runner, since we'll need to handle the callback anyway with local URLs...
 
-    bento_url = current_app.config["BENTO_URL"]
-
-    wm = WorkflowManager(
-        current_app.config["SERVICE_TEMP"],
-        service_base_url=current_app.config["SERVICE_BASE_URL"],
-        bento_url=bento_url,
-        logger=logger,
-        workflow_host_allow_list=workflow_host_allow_list,
-        validate_ssl=current_app.config["BENTO_VALIDATE_SSL"],
-        debug=current_app.config["BENTO_DEBUG"],
-    )
+    wm = _get_workflow_manager()
 
     # Optional Authorization HTTP header to forward to nested requests
     auth_header = request.headers.get("Authorization")
     auth_header_dict = {"Authorization": auth_header} if auth_header else {}
 
-    try:
-        wm.download_or_copy_workflow(
-            run_req.workflow_url, WorkflowType(run_req.workflow_type), auth_headers=auth_header_dict)
-    except UnsupportedWorkflowType:
-        return flask_bad_request_error(f"Unsupported workflow type: {run_req.workflow_type}")
-    except (WorkflowDownloadError, requests.exceptions.ConnectionError) as e:
-        return flask_bad_request_error(f"Could not access workflow file: {run_req.workflow_url} (Python error: {e})")
+    # Start fetching the workflow file, and set up the run directory while waiting on the network. Each request gets its
+    # own download thread, so that concurrent run submissions never queue behind each other's (potentially slow)
+    # downloads. Shutting down the executor right away doesn't stop the download; it just lets the thread exit once
+    # it's done. If we return early below, the download finishes (or fails) in the background and is ignored.
+    download_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="workflow-download")
+    workflow_download = download_executor.submit(
+        wm.download_or_copy_workflow,
+        run_req.workflow_url,
+        WorkflowType(run_req.workflow_type),
+        auth_headers=auth_header_dict,
+    )
+    download_executor.shutdown(wait=False)
 
     # ---
 
     # Begin creating the job after validating the request
-    run_id = uuid.uuid4()
+    # Only ever used as a string (directory name, database ID, task argument, response), so stringify it once
+    run_id = str(uuid.uuid4())
 
     # Create run directory
 
-    run_dir: Path = current_app.config["SERVICE_TEMP"] / str(run_id)
-    run_dir.mkdir(parents=True, exist_ok=True)
+    run_dir: Path = current_app.config["SERVICE_TEMP"] / run_id
+    try:
+        # No separate existence check - a UUID collision is vanishingly unlikely, so let mkdir tell us instead
+        run_dir.mkdir(parents=True)
+    except FileExistsError:
+        return flask_internal_server_error(f"UUID collision while creating run directory for run {run_id}")
 
     # TODO: Delete run dir if something goes wrong...
 
     # Move workflow attachments to run directory
+    # TODO: Do we put these in a subdirectory?
+    # TODO: Support WDL uploads for workflows
+    save_workflow_attachments(
+        workflow_attachment_list, run_dir, chunk_size=current_app.config["WORKFLOW_ATTACHMENT_CHUNK_SIZE"])
 
-    for attachment in workflow_attachment_list:
-        # TODO: Check and fix input if filename is non-secure
-        # TODO: Do we put these in a subdirectory?
-        # TODO: Support WDL uploads for workflows
-        attachment.save(os.path.join(run_dir, secure_filename(attachment.filename)))
+    try:
+        workflow_download.result()
+        download_err = None
+    except UnsupportedWorkflowType:
+        download_err = f"Unsupported workflow type: {run_req.workflow_type}"
+    except (WorkflowDownloadError, requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+        download_err = f"Could not access workflow file: {run_req.workflow_url} (Python error: {e})"
+
+    if download_err is not None:
+        # Don't leave the run directory (and any attachments) behind for a run which will never exist
+        shutil.rmtree(run_dir, ignore_errors=True)
+        return flask_bad_request_error(download_err)
 
     # Process parameters & inject non-secret values
     #  - Get injectable run config for processing inputs
     run_injectable_config = _config_for_run(run_dir)
     #  - Set up parameters
     run_params = {**run_req.workflow_params}
-    bento_services_data = None
     for run_input in run_req.tags.workflow_metadata.inputs:
         input_key = namespaced_input(run_req.tags.workflow_id, run_input.id)
         if isinstance(run_input, WorkflowConfigInput):
@@ -209,9 +254,8 @@ def _create_run(db: Database, c: sqlite3.Cursor) -> Response:
                 f"Injecting configuration parameter '{run_input.key}' into run {run_id}: {run_input.id}={config_value}")
             run_params[input_key] = config_value
         elif isinstance(run_input, WorkflowServiceUrlInput):
-            bento_services_data = bento_services_data or get_bento_services()
-            config_value: str | None = bento_services_data.get(run_input.service_kind).get("url")
             sk = run_input.service_kind
+            config_value: str | None = get_bento_service_url(sk)
             if config_value is None:
                 err = f"Could not find URL/service record for service kind '{sk}'"
                 logger.error(err)
@@ -220,7 +264,8 @@ def _create_run(db: Database, c: sqlite3.Cursor) -> Response:
                 f"Injecting URL for service kind '{sk}' into run {run_id}: {run_input.id}={config_value}")
             run_params[input_key] = config_value
 
-    # Will be updated to STATE_QUEUED once submitted
+    # Inserted as STATE_QUEUED directly, since the run is submitted right after this is committed; an intermediate state
+    # would only cost another commit, and is never visible to anyone else anyway.
     c.execute("""
         INSERT INTO runs (
             id,
@@ -234,68 +279,88 @@ def _create_run(db: Database, c: sqlite3.Cursor) -> Response:
             request__workflow_url,
             request__tags,
 
-            run_log__name
-        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            run_log__name,
+
+            project_id,
+            dataset_id,
+            workflow_id
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
     """, (
-        str(run_id),
-        states.STATE_UNKNOWN,
+        run_id,
+        states.STATE_QUEUED,
         json.dumps({}),
 
         json.dumps(run_params),
         run_req.workflow_type,
         run_req.workflow_type_version,
-        json.dumps(run_req.workflow_engine_parameters),
+        # Already validated as a JSON object of strings by RunRequest, and not otherwise used yet - store it as sent
+        # rather than re-serializing the parsed value
+        request.form["workflow_engine_parameters"],
         str(run_req.workflow_url),
         run_req.tags.model_dump_json(),
 
         run_req.tags.workflow_id,
+
+        *run_req.get_project_and_dataset(),
+        run_req.tags.workflow_id,
     ))
     db.commit()
+    logger.info(f"Queued run {run_id}")
 
     # TODO: figure out timeout
     # TODO: retry policy
 
-    db.update_run_state_and_commit(c, run_id, states.STATE_QUEUED, logger=logger, publish_event=False)
-
     run_workflow.delay(run_id)
 
-    return jsonify({"run_id": str(run_id)})
+    return jsonify({"run_id": run_id})
 
 
-PUBLIC_RUN_DETAILS_SHAPE = {
-    "request": {
-        "workflow_type": True,
-        "tags": {
-            "workflow_id": True,
-            "workflow_metadata": {
-                "data_type": True,
-            },
-            "project_id": True,
-            "dataset_id": True,
-        },
-    },
-    "run_log": {
-        "start_time": True,
-        "end_time": True,
-    },
-}
+def _run_details_dict(run: RunWithDetails, public: bool) -> dict:
+    if public:
+        return PublicRunWithDetails.model_validate(run, from_attributes=True).model_dump(
+            mode="json", exclude_unset=True)
+    return run.model_dump(mode="json")
+
+
+def _stream_json_list(items: Iterator[Any]) -> Iterator[str]:
+    # Serialize a JSON array item by item, so we never have to build the whole list (or its serialized form) at once.
+    # The first item is serialized right away, before the response starts, so an error there (e.g., a corrupt row)
+    # results in an error response. Errors part-way through can no longer change the status, so instead the array is
+    # ended with an error marker item, keeping the body well-formed JSON.
+    dumps = current_app.json.dumps
+    first = [dumps(item) for item in itertools.islice(items, 1)]
+
+    def _stream() -> Iterator[str]:
+        yield "[" + "".join(first)
+        try:
+            for item in items:
+                yield "," + dumps(item)
+        except Exception as e:
+            logger.error(f"Encountered error while streaming JSON list: {traceback.format_exc()}")
+            yield ("," if first else "") + dumps({"error": f"Error while streaming list: {type(e).__name__}"})
+        yield "]"
+
+    return _stream()
+
+
+def _where_sql(where_clauses: list[str]) -> str:
+    return f" WHERE {' AND '.join(where_clauses)}" if where_clauses else ""
 
-PRIVATE_RUN_DETAILS_SHAPE = {
-    "request": True,
-    "run_log": True,
-    "task_logs": True,
-    "outputs": True,
-}
+
+def _get_non_negative_int_arg(name: str) -> int | None:
+    if (val := request.args.get(name)) is None:
+        return None
+    if not val.isdigit():
+        raise ValueError(f"Query parameter {name} must be a non-negative integer")
+    return int(val)
 
 
 @bp_runs.route("/runs", methods=["GET", "POST"])
 def run_list():
-    db: Database = get_db()
-    c = db.cursor()
-
     if request.method == "POST":
+        db: Database = get_db()
         try:
-            return _create_run(db, c)
+            return _create_run(db, db.cursor())
         except pydantic.ValidationError:  # TODO: Better error messages
             logger.error(f"Encountered validation error during run creation: {traceback.format_exc()}")
             authz_middleware.mark_authz_done(request)
@@ -306,40 +371,79 @@ def run_list():
             return flask_bad_request_error("Value error")
 
     # GET
+    db: Database = get_ro_db()
+    c = db.cursor()
+
     # Bento Extension: Include run public details with /runs request
     public_endpoint = request.args.get("public", "false").lower() == "true"
     # Bento Extension: Include run details with /runs request
     with_details = request.args.get("with_details", "false").lower() == "true"
 
-    res_list = []
-    perms_list: list[RunRequest] = []
-
-    for r in c.execute("SELECT * FROM runs").fetchall():
-        run = db.run_with_details_from_row(c, r, stream_content=False)
-        perms_list.append(run.request)
-
-        if not public_endpoint or run.state == STATE_COMPLETE:
-            res_list.append({
-                **run.model_dump(mode="json", include={"run_id", "state"}),
-                **(
-                    {
-                        "details": run.model_dump(mode="json", include={
-                            "run_id": True,
-                            "state": True,
-                            **(PUBLIC_RUN_DETAILS_SHAPE if public_endpoint else PRIVATE_RUN_DETAILS_SHAPE),
-                        }),
-                    }
-                    if with_details else {}
-                ),
-            })
-
-    if not public_endpoint:
-        # Filter runs to just those which we have permission to view
-        res_list = [v for v, p in zip(res_list, _check_runs_permission(perms_list, P_VIEW_RUNS)) if p]
+    # Bento Extension: Pagination + filtering, done in SQL so that only the requested page of runs gets loaded
+    try:
+        limit = _get_non_negative_int_arg("limit")
+        offset = _get_non_negative_int_arg("offset") or 0
+    except ValueError as e:
+        authz_middleware.mark_authz_done(request)
+        return flask_bad_request_error(str(e))
+
+    where_clauses: list[str] = []
+    where_params: list[str | None] = []
+
+    if public_endpoint:
+        # Only completed runs are listed publicly
+        where_clauses.append("state = ?")
+        where_params.append(STATE_COMPLETE)
+
+    for arg, column in (("state", "state"), ("project", "project_id"), ("dataset", "dataset_id")):
+        if val := request.args.get(arg):
+            where_clauses.append(f"{column} = ?")
+            where_params.append(val)
+
+    if not public_endpoint and authz_enabled():
+        # Check permissions once for each distinct resource the matching runs belong to, then only select runs with
+        # resources we can view, so that pagination applies to visible runs only. This is all done before responding,
+        # so that a failed permissions check results in an error response rather than a truncated list.
+        resource_ids = [
+            tuple(r) for r in c.execute(
+                f"SELECT DISTINCT {RUN_RESOURCE_COLUMNS} FROM runs{_where_sql(where_clauses)}", where_params)
+        ]
+        visible_resource_ids = list(itertools.compress(
+            resource_ids, _check_resources_permission([build_resource(*r) for r in resource_ids], P_VIEW_RUNS)))
+
+        # Pass the visible resources as a single JSON array parameter rather than 3 parameters per resource, which
+        # could exceed SQLite's bound parameter limit. Resources are compared as JSON arrays, which matches NULLs too
+        # (IDs and data types are NULL for runs which don't target a project/dataset).
+        where_clauses.append(
+            f"json_array({RUN_RESOURCE_COLUMNS}) IN (SELECT json_array(json_extract(value, '$[0]'), "
+            "json_extract(value, '$[1]'), json_extract(value, '$[2]')) FROM json_each(?))")
+        where_params.append(json.dumps(visible_resource_ids))
 
     authz_middleware.mark_authz_done(request)
 
-    return jsonify(res_list)
+    # Never load stream contents (which can be very large) when listing runs - only their URLs are included
+    q = f"SELECT {RUN_DETAILS_COLUMNS} FROM runs{_where_sql(where_clauses)} ORDER BY rowid LIMIT ? OFFSET ?"
+
+    # Iterate over the cursor in batches rather than fetching all rows at once. Every selected run has already been
+    # checked for permissions, so only serialization is streamed. Use a separate cursor, since c is used to fetch task
+    # logs for each batch.
+    rc = db.cursor()
+    rc.execute(q, (*where_params, -1 if limit is None else limit, offset))  # LIMIT -1 means no limit in SQLite
+
+    def _iter_runs() -> Iterator[dict]:
+        while rows := rc.fetchmany(RUN_LIST_BATCH_SIZE):
+            # Fetch task logs for the whole batch of runs at once, rather than one query per run - and only if they're
+            # going to be included in the response.
+            task_logs = db.get_task_logs_for_runs(c, [r["id"] for r in rows]) if with_details else {}
+            for r in rows:
+                run = db.run_with_details_from_row(c, r, stream_content=False, task_logs=task_logs.get(r["id"], []))
+                yield {
+                    "run_id": run.run_id,
+                    "state": run.state,
+                    **({"details": _run_details_dict(run, public_endpoint)} if with_details else {}),
+                }
+
+    return current_app.response_class(stream_with_context(_stream_json_list(_iter_runs())), mimetype=MIME_JSON)
 
 
 def _run_none_response(run_id: uuid.UUID):
@@ -352,7 +456,7 @@ def _run_none_response(run_id: uuid.UUID):
 
 @bp_runs.route("/runs/<uuid:run_id>", methods=["GET"])
 def run_detail(run_id: uuid.UUID):
-    db: Database = get_db()
+    db: Database = get_ro_db()
     run_details = db.get_run_with_details(db.cursor(), run_id, stream_content=False)
 
     if run_details is None:
@@ -372,7 +476,7 @@ def _denest_list(x: Any) -> list:
 
 @bp_runs.route("/runs/<uuid:run_id>/download-artifact", methods=["POST"])
 def run_download_artifact(run_id: uuid.UUID):
-    db: Database = get_db()
+    db: Database = get_ro_db()
     run_details = db.get_run_with_details(db.cursor(), run_id, stream_content=False)
 
     if run_details is None:
@@ -413,10 +517,19 @@ def run_download_artifact(run_id: uuid.UUID):
     return r
 
 
-def get_stream(c: sqlite3.Cursor, stream: RunStream, run_id: uuid.UUID):
-    db: Database = get_db()
-    run = db.get_run_with_details(c, run_id, stream_content=True)
-    return (current_app.response_class(
+def get_stream(run_id: uuid.UUID, stream: RunStream) -> Response:
+    db = get_ro_db()
+    run_and_rowid = Database.get_run_and_rowid(db.cursor(), run_id)
+
+    if run_and_rowid is None:
+        return _run_none_response(run_id)
+
+    run, run_request, rowid = run_and_rowid
+
+    if not _check_single_run_permission_and_mark(run_request, P_VIEW_RUNS):
+        return flask_forbidden_error("Forbidden")
+
+    return current_app.response_class(
         headers={
             # If we've finished, we allow long-term (24h) caching of the stdout/stderr responses.
             # Otherwise, no caching allowed!
@@ -425,44 +538,25 @@ def get_stream(c: sqlite3.Cursor, stream: RunStream, run_id: uuid.UUID):
                 else "no-cache, no-store, must-revalidate, max-age=0"
             ),
         },
-        response=run.run_log.stdout if stream == "stdout" else run.run_log.stderr,
+        # Streams can be very large, so they're read from the database and sent in chunks rather than loaded all at once
+        response=stream_with_context(db.iter_run_stream(rowid, stream)),
         mimetype="text/plain",
         status=200,
-    ) if run is not None else flask_not_found_error(f"Stream {stream} not found for run {run_id}"))
-
-
-def check_run_authz_then_return_response(
-    c: sqlite3.Cursor,
-    run_id: uuid.UUID,
-    cb: Callable[[], Response | dict],
-    permission: str = P_VIEW_RUNS,
-):
-    db: Database = get_db()
-    run = db.get_run_with_details(c, run_id, stream_content=False)
-
-    if run is None:
-        return _run_none_response(run_id)
-
-    if not _check_single_run_permission_and_mark(run.request, permission):
-        return flask_forbidden_error("Forbidden")
-
-    return cb()
+    )
 
 
 @bp_runs.route("/runs/<uuid:run_id>/stdout", methods=["GET"])
 def run_stdout(run_id: uuid.UUID):
-    c = get_db().cursor()
-    return check_run_authz_then_return_response(c, run_id, lambda: get_stream(c, "stdout", run_id))
+    return get_stream(run_id, "stdout")
 
 
 @bp_runs.route("/runs/<uuid:run_id>/stderr", methods=["GET"])
 def run_stderr(run_id: uuid.UUID):
-    c = get_db().cursor()
-    return check_run_authz_then_return_response(c, run_id, lambda: get_stream(c, "stderr", run_id))
+    return get_stream(run_id, "stderr")
 
 
-RUN_CANCEL_BAD_REQUEST_STATES = (
-    ((states.STATE_CANCELING, states.STATE_CANCELED), "Run already canceled"),
+RUN_CANCEL_BAD_REQUEST_STATES: tuple[tuple[frozenset[str], str], ...] = (
+    (states.CANCELED_STATES, "Run already canceled"),
     (states.FAILURE_STATES, "Run already terminated with error"),
     (states.SUCCESS_STATES, "Run already completed"),
 )
@@ -478,50 +572,73 @@ def run_cancel(run_id: uuid.UUID):
 
     run_id_str = str(run_id)
 
-    def perform_run_cancel() -> Response:
-        run = db.get_run_with_details(c, run_id_str, stream_content=False)
+    # Only the run's state, request (for checking permissions), and Celery task ID are needed, so don't load any other
+    # details (run log, task logs, outputs.)
+    run_request_and_celery_id = Database.get_run_request_and_celery_id(c, run_id)
 
-        if run is None:
-            return flask_not_found_error(f"Run {run_id_str} not found")
+    if run_request_and_celery_id is None:
+        return _run_none_response(run_id)
 
-        for bad_req_states, bad_req_err in RUN_CANCEL_BAD_REQUEST_STATES:
-            if run.state in bad_req_states:
-                return flask_bad_request_error(bad_req_err)
+    run, run_request, celery_id = run_request_and_celery_id
 
-        celery_id = run.run_log.celery_id
+    if not _check_single_run_permission_and_mark(run_request, P_VIEW_RUNS):
+        return flask_forbidden_error("Forbidden")
 
-        if celery_id is None:
-            # Never made it into the queue, so "cancel" it
-            return flask_internal_server_error(f"No Celery ID present for run {run_id_str}")
+    for bad_req_states, bad_req_err in RUN_CANCEL_BAD_REQUEST_STATES:
+        if run.state in bad_req_states:
+            return flask_bad_request_error(bad_req_err)
 
-        event_bus = get_flask_event_bus()
+    if celery_id is None:
+        # Never made it into the queue, so "cancel" it
+        return flask_internal_server_error(f"No Celery ID present for run {run_id_str}")
 
-        # TODO: terminate=True might be iffy
-        db.update_run_state_and_commit(c, run_id_str, states.STATE_CANCELING, event_bus=event_bus)
-        celery.control.revoke(celery_id, terminate=True)  # Remove from queue if there, terminate if running
+    event_bus = get_flask_event_bus()
 
-        # TODO: wait for revocation / failure and update status...
+    # TODO: terminate=True might be iffy
+    celery.control.revoke(celery_id, terminate=True)  # Remove from queue if there, terminate if running
 
-        # TODO: Generalize clean-up code / fetch from back-end
-        run_dir = current_app.config["SERVICE_TEMP"] / run_id_str
-        if not current_app.config["BENTO_DEBUG"]:
-            shutil.rmtree(run_dir, ignore_errors=True)
+    # TODO: wait for revocation / failure and update status...
 
-        db.update_run_state_and_commit(c, run_id_str, states.STATE_CANCELED, event_bus=event_bus)
+    # TODO: Generalize clean-up code / fetch from back-end
+    if not current_app.config["BENTO_DEBUG"]:
+        # Deleting the run directory can take a while for big runs, so don't do it while handling the request
+        cleanup_run_dir.delay(run_id_str)
 
-        return current_app.response_class(status=204)  # TODO: Better response
+    # Revocation has been sent and clean-up is queued, so go straight to CANCELED in a single update + commit
+    # rather than committing an intermediate CANCELING state.
+    db.update_run_state_and_commit(c, run_id_str, states.STATE_CANCELED, event_bus=event_bus)
 
-    return check_run_authz_then_return_response(c, run_id, perform_run_cancel)
+    return current_app.response_class(status=204)  # TODO: Better response
 
 
 @bp_runs.route("/runs/<uuid:run_id>/status", methods=["GET"])
 def run_status(run_id: uuid.UUID):
-    db: Database = get_db()
-    c = db.cursor()
+    run_id_str = str(run_id)
+
+    with _terminated_run_statuses_lock:
+        if (cached := _terminated_run_statuses.get(run_id_str)) is not None:
+            _terminated_run_statuses.move_to_end(run_id_str)
 
-    def run_status_response() -> Response:
-        if run := db.get_run(c, run_id):
-            return jsonify(run.model_dump())
-        return flask_not_found_error(f"Run {run_id} not found")
+    if cached is None:
+        # Only the run's state and request (for checking permissions) are needed, so don't load any other details
+        run_and_request = Database.get_run_and_request(get_ro_db().cursor(), run_id)
+
+        if run_and_request is None:
+            return _run_none_response(run_id)
+
+        run, run_request = run_and_request
+        resource, status_json = _get_resource_for_run_request(run_request), json.dumps(run.model_dump())
+
+        if run.state in states.TERMINATED_STATES:
+            with _terminated_run_statuses_lock:
+                _terminated_run_statuses[run_id_str] = (resource, status_json)
+                if len(_terminated_run_statuses) > RUN_STATUS_CACHE_MAX_ENTRIES:
+                    _terminated_run_statuses.popitem(last=False)
+    else:
+        resource, status_json = cached
+
+    # Permissions are still checked for every request, even if the status is cached
+    if not _check_single_resource_permission_and_mark(resource, P_VIEW_RUNS):
+        return flask_forbidden_error("Forbidden")
 
-    return check_run_authz_then_return_response(c, run_id, run_status_response)
+    return current_app.response_class(status_json, mimetype=MIME_JSON)
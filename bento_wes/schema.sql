@@ -25,7 +25,12 @@ CREATE TABLE runs (
     run_log__exit_code INTEGER DEFAULT NULL,                         -- Exit code
 
     -- Non-standard columns
-    run_log__celery_id INTEGER DEFAULT NULL                          -- UUID task ID from Celery
+    run_log__celery_id INTEGER DEFAULT NULL,                         -- UUID task ID from Celery
+
+    -- Bento-specific columns, extracted from the request for filtering runs without parsing request JSON
+    project_id TEXT DEFAULT NULL,                                    -- Project targeted by the run, if any
+    dataset_id TEXT DEFAULT NULL,                                    -- Dataset targeted by the run, if any
+    workflow_id TEXT DEFAULT NULL                                    -- From request__tags
 );
 
 CREATE TABLE task_logs (
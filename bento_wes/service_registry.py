@@ -1,16 +1,19 @@
-import requests
-from datetime import datetime
+import time
 from flask import current_app
 
+from .constants import HTTP_REQUEST_TIMEOUT
+from .http_session import get_http_session
+
 __all__ = [
     "get_bento_services",
+    "get_bento_service_url",
 ]
 
 
 # TODO: this will need to be re-done without a global cache for any async implementation
 
 _bento_services_cache: dict | None = None
-_bento_services_last_updated: datetime | None = None
+_bento_services_last_updated: float | None = None  # time.monotonic() value; unaffected by system clock changes
 
 _cache_ttl: int = 30  # seconds
 
@@ -22,13 +25,23 @@ def get_bento_services() -> dict:
     if not (
             _bento_services_cache and
             _bento_services_last_updated and
-            (datetime.now() - _bento_services_last_updated).total_seconds() < _cache_ttl
+            time.monotonic() - _bento_services_last_updated < _cache_ttl
     ):
         validate_ssl = current_app.config["BENTO_VALIDATE_SSL"]
-        res = requests.get(
-            current_app.config["SERVICE_REGISTRY_URL"].rstrip("/") + "/bento-services", verify=validate_ssl)
+        res = get_http_session().get(
+            current_app.config["SERVICE_REGISTRY_URL"].rstrip("/") + "/bento-services", verify=validate_ssl,
+            timeout=HTTP_REQUEST_TIMEOUT)
         res.raise_for_status()
         _bento_services_cache = {v["service_kind"]: v for v in res.json().values()}
-        _bento_services_last_updated = datetime.now()
+        _bento_services_last_updated = time.monotonic()
 
     return _bento_services_cache
+
+
+def get_bento_service_url(service_kind: str) -> str | None:
+    """
+    Looks up a service's URL by its kind from the (cached) service registry data.
+    :param service_kind: Bento service kind to look up (e.g., drop-box)
+    :return: The service URL, or None if there is no service/URL for the kind
+    """
+    return (get_bento_services().get(service_kind) or {}).get("url")
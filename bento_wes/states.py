@@ -14,6 +14,7 @@ __all__ = [
 
     "FailureState",
 
+    "CANCELED_STATES",
     "FAILURE_STATES",
     "SUCCESS_STATES",
     "TERMINATED_STATES",
@@ -32,6 +33,7 @@ STATE_CANCELING: Literal["CANCELING"] = "CANCELING"
 
 FailureState = Literal["EXECUTOR_ERROR", "SYSTEM_ERROR"]
 
-FAILURE_STATES = frozenset({STATE_EXECUTOR_ERROR, STATE_SYSTEM_ERROR})
-SUCCESS_STATES = frozenset({STATE_COMPLETE})
-TERMINATED_STATES = FAILURE_STATES.union(SUCCESS_STATES)
+CANCELED_STATES: frozenset[str] = frozenset({STATE_CANCELING, STATE_CANCELED})
+FAILURE_STATES: frozenset[str] = frozenset({STATE_EXECUTOR_ERROR, STATE_SYSTEM_ERROR})
+SUCCESS_STATES: frozenset[str] = frozenset({STATE_COMPLETE})
+TERMINATED_STATES: frozenset[str] = FAILURE_STATES.union(SUCCESS_STATES)
@@ -1,8 +1,23 @@
-from datetime import datetime, timezone
+import time
 
 
 __all__ = ["iso_now"]
 
 
+# (second, formatted timestamp) for the last call to iso_now(), since it is often called many times in the same second.
+# Stored as a single tuple so that it's replaced atomically.
+_iso_now_cache: tuple[int, str] = (-1, "")
+
+
 def iso_now() -> str:
-    return datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")  # ISO date format
+    global _iso_now_cache
+
+    t = int(time.time())
+    cached_t, cached_str = _iso_now_cache
+    if t == cached_t:
+        return cached_str
+
+    y, mo, d, h, mi, s, *_ = time.gmtime(t)
+    now_str = f"{y:04d}-{mo:02d}-{d:02d}T{h:02d}:{mi:02d}:{s:02d}Z"  # ISO date format
+    _iso_now_cache = (t, now_str)
+    return now_str
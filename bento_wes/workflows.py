@@ -1,21 +1,31 @@
+import fcntl
+import functools
+import hashlib
+import json
 import logging
-
+import os
 import shutil
 import requests
+import tempfile
+import threading
+import time
 
-from base64 import urlsafe_b64encode
+from collections import OrderedDict
 from pathlib import Path
 from pydantic import AnyUrl
 from typing import NewType
-from urllib.parse import urlparse
+from urllib.parse import ParseResult, urlparse
 
 from bento_wes import states
+from bento_wes.constants import HTTP_REQUEST_TIMEOUT
+from bento_wes.http_session import get_http_session
 
 __all__ = [
     "WorkflowType",
     "WES_WORKFLOW_TYPE_WDL",
     "WES_WORKFLOW_TYPE_CWL",
     "parse_workflow_host_allow_list",
+    "host_allowed",
     "UnsupportedWorkflowType",
     "WorkflowDownloadError",
     "WorkflowManager",
@@ -36,20 +46,132 @@ WORKFLOW_EXTENSIONS: dict[WorkflowType, str] = {
 
 ALLOWED_WORKFLOW_URL_SCHEMES = ("http", "https", "file")
 ALLOWED_WORKFLOW_REQUEST_SCHEMES = ("http", "https")
+MAX_WORKFLOW_URL_LENGTH = 4096
+
+# Used when a WorkflowManager isn't given a logger, so that logging calls don't need to check for one
+_null_logger = logging.getLogger(f"{__name__}.null")
+_null_logger.addHandler(logging.NullHandler())
+_null_logger.propagate = False
+
+DEFAULT_PORTS: dict[str, int] = {"http": 80, "https": 443}
 
 MAX_WORKFLOW_FILE_BYTES = 50000  # 50 KB
+# Large enough that a workflow file under the size limit arrives in a single chunk
+WORKFLOW_DOWNLOAD_CHUNK_SIZE = 64 * 1024  # 64 KiB
+# Linux ioctl request for cloning a whole file as a copy-on-write reflink (supported by e.g. Btrfs and XFS)
+FICLONE = 0x40049409
+# Workflow files which were downloaded or re-validated less than this many seconds ago are used as-is, without checking
+# with the server again; this avoids any network requests when the same workflow is submitted many times in a row.
+WORKFLOW_FRESH_TTL = 60
+WORKFLOW_FRESH_MAX_ENTRIES = 64
+WORKFLOW_DOWNLOAD_TIMEOUT = HTTP_REQUEST_TIMEOUT
+
+
+@functools.lru_cache(maxsize=256)
+def _normalize_host(host: str) -> str:
+    """
+    Normalizes a host name to the case-folded ASCII (punycode) form used by pydantic URLs, so that allow list entries
+    and workflow URL hosts can be compared directly regardless of how they were written.
+    """
+    try:
+        return host.encode("idna").decode("ascii").casefold()
+    except UnicodeError:  # Not a valid IDN (e.g., an empty or over-long label) - compare it as-is
+        return host.casefold()
 
 
-def parse_workflow_host_allow_list(allow_list: str | None) -> set[str] | None:
+def parse_workflow_host_allow_list(allow_list: str | None) -> frozenset[str] | None:
     """
     Get set of allowed workflow hosts from a configuration string for any
     checks while downloading workflows. If it's blank, assume that means
     "any host is allowed" and set to None (as opposed to empty, i.e. no hosts
-    allowed to provide workflows.)
+    allowed to provide workflows.) Host names are normalized to case-folded ASCII
+    form to match the (already-normalized) hosts of pydantic URLs. Entries may be
+    wildcards of the form *.example.org to allow all subdomains; see host_allowed.
     :param allow_list: Comma-separated list of allowed workflow hosts, or None.
     :return:
     """
-    return {a.strip() for a in (allow_list or "").split(",") if a.strip()} or None
+    return frozenset(_normalize_host(a) for a in (h.strip() for h in (allow_list or "").split(",")) if a) or None
+
+
+def _host_header(uri: AnyUrl) -> str:
+    # Equivalent to the URL's netloc (minus any credentials), without having to re-parse the URL string
+    host = uri.host or ""
+    if uri.port is not None and uri.port != DEFAULT_PORTS.get(uri.scheme):
+        host += f":{uri.port}"
+    return host
+
+
+def _write_file_atomic(path: Path, data: bytes) -> None:
+    # Write to a temporary file in the same directory and then rename it over the destination, so that readers see
+    # either the old or the new contents, never a missing or partially-written file.
+    # Files are small, so write them directly with os.write rather than going through Python's buffered IO layer.
+    # mkstemp creates the file with mode 0o600, since workflow files may contain URLs with credentials in them.
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=f"{path.name}.", suffix=".part")
+    try:
+        try:
+            with memoryview(data) as mv:
+                written = 0
+                while written < len(mv):
+                    written += os.write(fd, mv[written:])
+        finally:
+            os.close(fd)
+        os.replace(tmp_path, path)
+    finally:
+        Path(tmp_path).unlink(missing_ok=True)
+
+
+def _clone_or_copy_file_atomic(src: str, dest: Path, src_stat: os.stat_result) -> None:
+    # Clone the source file into place with a copy-on-write reflink if the file system supports it, which doesn't copy
+    # any data; otherwise, copy it. Unlike a hard link, the cached file never shares an inode with the source, so
+    # changes to one can't show up in the other. Either way, go via a temporary file so the destination is replaced
+    # atomically, and give it the source's modification time so an unchanged source can be recognized later.
+    fd, tmp_path = tempfile.mkstemp(dir=dest.parent, prefix=f"{dest.name}.", suffix=".part")
+    try:
+        with open(fd, "wb") as df, open(src, "rb") as sf:
+            try:
+                fcntl.ioctl(df.fileno(), FICLONE, sf.fileno())
+            except OSError:  # e.g., no reflink support (EOPNOTSUPP) or different file systems (EXDEV)
+                shutil.copyfileobj(sf, df)
+        os.utime(tmp_path, ns=(src_stat.st_atime_ns, src_stat.st_mtime_ns))
+        os.replace(tmp_path, dest)
+    finally:
+        Path(tmp_path).unlink(missing_ok=True)
+
+
+def _is_unchanged_copy(path: Path, src_stat: os.stat_result) -> bool:
+    try:
+        st = path.stat()
+    except FileNotFoundError:
+        return False
+    # A hard link to the source (i.e., the same file) isn't a copy, since it changes along with the source
+    return (
+        not os.path.samestat(st, src_stat)
+        and (st.st_size, st.st_mtime_ns) == (src_stat.st_size, src_stat.st_mtime_ns)
+    )
+
+
+@functools.lru_cache(maxsize=1024)
+def _workflow_file_name(workflow_uri: str, extension: str) -> str:
+    # Name workflow files by a hash of their URI, which (unlike an encoding of the whole URI) is fixed-length, so long
+    # URIs can't exceed file name length limits. The same workflow URIs get run over and over, so cache their names.
+    return f"workflow_{hashlib.blake2b(workflow_uri.encode('utf-8'), digest_size=16).hexdigest()}.{extension}"
+
+
+def host_allowed(host: str, allow_list: frozenset[str]) -> bool:
+    """
+    Checks whether a host is in a parsed workflow host allow list. Entries match hosts exactly, except for wildcard
+    entries of the form *.example.org, which match any subdomain (at any depth) of example.org - but not example.org
+    itself. Each parent domain is checked with a single set lookup, so this takes one lookup per label of the host.
+    :param host: The host to check.
+    :param allow_list: A parsed allow list, from parse_workflow_host_allow_list.
+    """
+
+    host = _normalize_host(host)
+    if host in allow_list:
+        return True
+
+    labels = host.split(".")
+    return any(f"*.{'.'.join(labels[i:])}" in allow_list for i in range(1, len(labels)))
 
 
 class UnsupportedWorkflowType(Exception):
@@ -67,31 +189,48 @@ class WorkflowManager:
         service_base_url: str,
         bento_url: str | None = None,
         logger: logging.Logger | None = None,
-        workflow_host_allow_list: str | None = None,
+        workflow_host_allow_list: frozenset[str] | str | None = None,
         validate_ssl: bool = True,
         debug: bool = False,
+        timeout: float | tuple[float, float] = WORKFLOW_DOWNLOAD_TIMEOUT,
     ):
         self.tmp_dir: Path = tmp_dir
         self.service_base_url: str = service_base_url
         self.bento_url: str | None = bento_url
-        self.logger: logging.Logger | None = logger
-        self.workflow_host_allow_list: str | None = workflow_host_allow_list
+        self._parsed_bento_url: ParseResult | None = urlparse(bento_url) if bento_url else None
+        self.logger: logging.Logger = logger or _null_logger
+        # Accept an un-parsed allow list string too, so that a raw configuration value can never end up being used for a
+        # substring check instead of a set membership check.
+        self.workflow_host_allow_list: frozenset[str] | None = (
+            parse_workflow_host_allow_list(workflow_host_allow_list) if isinstance(workflow_host_allow_list, str)
+            else workflow_host_allow_list)
         self._validate_ssl: bool = validate_ssl
         self._debug_mode: bool = debug
-
-        self._debug(f"Instantiating WorkflowManager with debug_mode={self._debug_mode}")
-
-    def _debug(self, message: str):
-        if self.logger:
-            self.logger.debug(message)
-
-    def _info(self, message: str):
-        if self.logger:
-            self.logger.info(message)
-
-    def _error(self, message: str):
-        if self.logger:
-            self.logger.error(message)
+        self._timeout: float | tuple[float, float] = timeout
+
+        # Workflow file path: time.monotonic() value of when it was last downloaded or confirmed unchanged. Kept in LRU
+        # order, with at most WORKFLOW_FRESH_MAX_ENTRIES entries.
+        self._fresh_workflows: OrderedDict[Path, float] = OrderedDict()
+        self._fresh_workflows_lock = threading.Lock()
+
+        self.logger.debug("Instantiating WorkflowManager with debug_mode=%s", self._debug_mode)
+
+    def _is_fresh(self, workflow_path: Path) -> bool:
+        with self._fresh_workflows_lock:
+            if (checked := self._fresh_workflows.get(workflow_path)) is None:
+                return False
+            if time.monotonic() - checked >= WORKFLOW_FRESH_TTL:
+                del self._fresh_workflows[workflow_path]
+                return False
+            self._fresh_workflows.move_to_end(workflow_path)
+        return workflow_path.exists()
+
+    def _mark_fresh(self, workflow_path: Path) -> None:
+        with self._fresh_workflows_lock:
+            self._fresh_workflows[workflow_path] = time.monotonic()
+            self._fresh_workflows.move_to_end(workflow_path)
+            if len(self._fresh_workflows) > WORKFLOW_FRESH_MAX_ENTRIES:
+                self._fresh_workflows.popitem(last=False)
 
     def workflow_path(self, workflow_uri: AnyUrl, workflow_type: WorkflowType) -> Path:
         """
@@ -100,9 +239,60 @@ class WorkflowManager:
         if workflow_type not in WES_SUPPORTED_WORKFLOW_TYPES:
             raise UnsupportedWorkflowType(f"Unsupported workflow type: {workflow_type}")
 
-        workflow_name = str(urlsafe_b64encode(bytes(str(workflow_uri), encoding="utf-8")), encoding="utf-8").replace(
-            "=", "")
-        return self.tmp_dir / f"workflow_{workflow_name}.{WORKFLOW_EXTENSIONS[workflow_type]}"
+        return self.tmp_dir / _workflow_file_name(str(workflow_uri), WORKFLOW_EXTENSIONS[workflow_type])
+
+    @staticmethod
+    def _cache_meta_path(workflow_path: Path) -> Path:
+        return workflow_path.with_suffix(".meta.json")
+
+    @classmethod
+    def _read_cache_meta(cls, workflow_path: Path) -> dict[str, str | None] | None:
+        """
+        Reads the metadata saved alongside a cached workflow file: ETag and Last-Modified headers from the response
+        it was downloaded from, and a SHA-256 hash of its contents.
+        """
+        if not workflow_path.exists():
+            return None
+        try:
+            return json.loads(cls._cache_meta_path(workflow_path).read_bytes())
+        except (OSError, ValueError):  # Missing or corrupt
+            return None
+
+    @staticmethod
+    def _conditional_headers(cache_meta: dict[str, str | None] | None) -> dict[str, str]:
+        if not cache_meta:
+            return {}
+        return {
+            header: v
+            for header, key in (("If-None-Match", "etag"), ("If-Modified-Since", "last_modified"))
+            if (v := cache_meta.get(key))
+        }
+
+    @staticmethod
+    def _save_workflow_response(wr: requests.Response, workflow_path: Path, cached_sha256: str | None) -> str | None:
+        """
+        Reads a workflow file response and saves it to disk, giving up as soon as it turns out to be too large. The file
+        is written next to its final location and moved into place once complete, so a partial download never replaces
+        a cached copy. If the contents match the cached copy, the cached copy is left untouched.
+        :return: The SHA-256 hash of the workflow file if it was saved, or None if it was too large.
+        """
+
+        try:
+            if int(wr.headers.get("Content-Length", "0")) >= MAX_WORKFLOW_FILE_BYTES:
+                return None  # Too large - don't bother reading any of it
+        except ValueError:  # Bad Content-Length; fall back to counting bytes as we go
+            pass
+
+        # Workflow files are small, so collect the (capped) response in memory and write it out in one go
+        content = bytearray()
+        for chunk in wr.iter_content(WORKFLOW_DOWNLOAD_CHUNK_SIZE):
+            content += chunk
+            if len(content) >= MAX_WORKFLOW_FILE_BYTES:
+                return None
+
+        if (digest := hashlib.sha256(content).hexdigest()) != cached_sha256:
+            _write_file_atomic(workflow_path, content)
+        return digest
 
     def download_or_copy_workflow(
         self,
@@ -120,68 +310,101 @@ class WorkflowManager:
 
         # TODO: Handle references to attachments
 
+        # Reject anything we'd never fetch before doing any other work with the URI
+        if workflow_uri.scheme not in ALLOWED_WORKFLOW_URL_SCHEMES:
+            raise WorkflowDownloadError(f"Unsupported workflow URI scheme: {workflow_uri.scheme}")
+        if len(str(workflow_uri)) >= MAX_WORKFLOW_URL_LENGTH:
+            raise WorkflowDownloadError(f"Workflow URI is too long (max length: {MAX_WORKFLOW_URL_LENGTH - 1})")
+
         workflow_path = self.workflow_path(workflow_uri, workflow_type)
 
         if workflow_uri.scheme not in ALLOWED_WORKFLOW_REQUEST_SCHEMES:  # file://
             # TODO: Other else cases
             # TODO: Handle exceptions
-            shutil.copyfile(workflow_uri.path, workflow_path)
+            # Local workflow files are held to the same size limit as downloaded ones
+            if (src_stat := os.stat(workflow_uri.path)).st_size >= MAX_WORKFLOW_FILE_BYTES:
+                raise WorkflowDownloadError(f"WorkflowDownloadError: {workflow_uri.path} is too large")
+            # Only trust a cached copy if its size and modification time still match the source's
+            if not _is_unchanged_copy(workflow_path, src_stat):
+                _clone_or_copy_file_atomic(workflow_uri.path, workflow_path, src_stat)
             return
 
         if self.workflow_host_allow_list is not None:
             # We need to check that the workflow in question is from an
             # allowed set of workflow hosts
-            if workflow_uri.scheme != "file" and workflow_uri.host not in self.workflow_host_allow_list:
+            # (file:// URIs have already been handled above.)
+            if not host_allowed(workflow_uri.host or "", self.workflow_host_allow_list):
                 # Dis-allowed workflow URL
-                self._error(
-                    f"Dis-allowed workflow host: {workflow_uri.host} (allow list: {self.workflow_host_allow_list})")
+                self.logger.error(
+                    "Dis-allowed workflow host: %s (allow list: %s)", workflow_uri.host, self.workflow_host_allow_list)
                 return states.STATE_EXECUTOR_ERROR
 
-        self._info(f"Fetching workflow file from {workflow_uri}")
+        if self._is_fresh(workflow_path):
+            self.logger.info("Using recently-fetched workflow file for %s", workflow_uri)
+            return
+
+        self.logger.info("Fetching workflow file from %s", workflow_uri)
 
         # SECURITY: We cannot pass our auth token outside the Bento instance. Validate that BENTO_URL is
         # a) a valid URL and b) a prefix of our workflow's URI before downloading.
         # Only bother doing this if BENTO_URL is actually set.
         use_auth_headers: bool = False
-        if self.bento_url:
-            parsed_bento_url = urlparse(self.bento_url)
-            use_auth_headers = all((
-                self.bento_url,
-                parsed_bento_url.scheme == workflow_uri.scheme,
-                parsed_bento_url.netloc == workflow_uri.host,
-                workflow_uri.path.startswith(parsed_bento_url.path),
-            ))
+        if parsed_bento_url := self._parsed_bento_url:
+            # Cheap equality checks first, so the path prefix check is skipped for workflows hosted elsewhere
+            use_auth_headers = (
+                parsed_bento_url.scheme == workflow_uri.scheme
+                and parsed_bento_url.netloc == workflow_uri.host
+                and (workflow_uri.path or "").startswith(parsed_bento_url.path)
+            )
+
+        # If we've downloaded this workflow before, ask the server to only send it again if it has changed
+        cache_meta = self._read_cache_meta(workflow_path)
+        conditional_headers = self._conditional_headers(cache_meta)
 
         # TODO: Better auth? May only be allowed to access specific workflows
         try:
             url = str(workflow_uri)
-            wr = requests.get(
+            # Stream the response rather than loading it into memory all at once, so that we can stop reading as soon
+            # as it's past the maximum workflow file size.
+            with get_http_session().get(
                 url,
                 headers={
-                    "Host": urlparse(url or "").netloc or "",
+                    "Host": _host_header(workflow_uri),
+                    **conditional_headers,
                     **(auth_headers if use_auth_headers else {}),
                 },
                 verify=self._validate_ssl,
-            )
-        except requests.exceptions.ConnectionError as e:
+                stream=True,
+                timeout=self._timeout,
+            ) as wr:
+                if wr.status_code == 304 and conditional_headers:
+                    self.logger.info("Workflow file not modified; using cached copy")
+                    self._mark_fresh(workflow_path)
+                    return
+
+                downloaded = False
+                if wr.status_code == 200:
+                    sha256 = self._save_workflow_response(wr, workflow_path, (cache_meta or {}).get("sha256"))
+                    if downloaded := sha256 is not None:
+                        _write_file_atomic(self._cache_meta_path(workflow_path), json.dumps({
+                            "etag": wr.headers.get("ETag"),
+                            "last_modified": wr.headers.get("Last-Modified"),
+                            "sha256": sha256,
+                        }).encode("utf-8"))
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
             if workflow_path.exists():  # Use cached version if needed, otherwise error
                 return
             else:
                 # Network issues
                 raise e
 
-        if wr.status_code == 200 and len(wr.content) < MAX_WORKFLOW_FILE_BYTES:
-            if workflow_path.exists():
-                workflow_path.unlink()
-
-            with open(workflow_path, "wb") as nwf:
-                nwf.write(wr.content)
-
-            self._info("Workflow file downloaded")
+        if downloaded:
+            self.logger.info("Workflow file downloaded")
+            self._mark_fresh(workflow_path)
 
         elif not workflow_path.exists():  # Use cached version if needed, otherwise error
             # Request issues
-            self._error(
-                f"Error downloading workflow: {workflow_uri} (use_auth_headers={use_auth_headers}, "
-                f"wr.status_code={wr.status_code})")
+            self.logger.error(
+                "Error downloading workflow: %s (use_auth_headers=%s, wr.status_code=%d)",
+                workflow_uri, use_auth_headers, wr.status_code)
             raise WorkflowDownloadError(f"WorkflowDownloadError: {workflow_path} does not exist")
@@ -11,6 +11,7 @@ def app():
 
     from bento_wes.app import application
     from bento_wes.db import init_db
+    from bento_wes.runs import WORKFLOW_MANAGER_EXTENSION_KEY
 
     application.config["TESTING"] = True
     application.config["DATABASE"] = ":memory:"
@@ -20,6 +21,9 @@ def app():
         init_db()
         yield application
 
+    # Don't share the workflow manager (and what it has recently downloaded) between tests
+    application.extensions.pop(WORKFLOW_MANAGER_EXTENSION_KEY, None)
+
     # TODO: Set up SERVICE_TEMP
     # TODO: Specify backend
 
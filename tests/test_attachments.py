@@ -0,0 +1,107 @@
+import io
+
+from tempfile import SpooledTemporaryFile
+from werkzeug.datastructures import FileStorage
+
+from bento_wes.attachments import save_workflow_attachment
+
+
+def _spooled_upload(data: bytes, rolled: bool) -> FileStorage:
+    stream = SpooledTemporaryFile(max_size=len(data) - 1 if rolled else len(data) + 1, mode="rb+")
+    stream.write(data)
+    stream.seek(0)
+    assert (stream.name is not None) == rolled  # Only has a name once it's been rolled over to disk
+    return FileStorage(stream=stream, filename="test.json")
+
+
+def test_save_workflow_attachment_in_memory(tmp_path):
+    data = b'{"hello": "world"}'
+    dest = save_workflow_attachment(FileStorage(stream=io.BytesIO(data), filename="../test.json"), tmp_path)
+    assert dest == tmp_path / "test.json"
+    assert dest.read_bytes() == data
+
+    # Neither in memory nor on disk, with a small buffer - many chunks
+    upload = FileStorage(stream=io.BufferedReader(io.BytesIO(data)), filename="test.json")
+    dest = save_workflow_attachment(upload, tmp_path, chunk_size=4)
+    assert dest == tmp_path / "test (1).json"
+    assert dest.read_bytes() == data
+
+    # Unusable file names
+    assert save_workflow_attachment(FileStorage(stream=io.BytesIO(data), filename=".."), tmp_path).name == "attachment"
+
+
+def test_save_workflow_attachment_spooled(tmp_path):
+    data = b"0123456789" * 1000
+
+    upload = _spooled_upload(data, rolled=False)
+    assert save_workflow_attachment(upload, tmp_path).read_bytes() == data
+    assert upload.stream.name is None  # Shouldn't have been forced onto disk
+    assert upload.stream.closed
+
+    dest = save_workflow_attachment(_spooled_upload(data, rolled=True), tmp_path)
+    assert dest == tmp_path / "test (1).json"
+    assert dest.read_bytes() == data
+
+    # Copied from the upload's current position, rather than from the start of the file
+    upload = _spooled_upload(data, rolled=True)
+    upload.stream.seek(5)
+    assert save_workflow_attachment(upload, tmp_path).read_bytes() == data[5:]
+
+
+def test_save_workflow_attachment_no_sendfile(tmp_path, monkeypatch):
+    import errno
+    import os
+
+    def _sendfile_not_socket(*_args):
+        raise OSError(errno.ENOTSOCK, "Socket operation on non-socket")
+
+    # e.g., macOS, where sendfile(2) only writes to sockets
+    monkeypatch.setattr(os, "sendfile", _sendfile_not_socket)
+
+    data = b"0123456789" * 1000
+    upload = _spooled_upload(data, rolled=True)
+    upload.stream.seek(5)
+    assert save_workflow_attachment(upload, tmp_path).read_bytes() == data[5:]
+
+
+def test_pooled_buffer():
+    from bento_wes import attachments
+
+    with attachments._pooled_buffer(16) as mv:
+        assert len(mv) == 16
+        buf = mv.obj
+
+    # Buffers get re-used, unless the size doesn't match
+    with attachments._pooled_buffer(16) as mv:
+        assert mv.obj is buf
+    with attachments._pooled_buffer(32) as mv:
+        assert len(mv) == 32
+
+
+def test_save_workflow_attachments(tmp_path):
+    from bento_wes.attachments import save_workflow_attachments
+
+    uploads = [FileStorage(stream=io.BytesIO(f"file {i}".encode()), filename=f"{i}.txt") for i in range(10)]
+    uploads.append(_spooled_upload(b"0123456789" * 1000, rolled=True))
+    uploads.append(FileStorage(stream=io.BytesIO(b"last"), filename="0.txt"))
+
+    dests = save_workflow_attachments(uploads, tmp_path, max_workers=3)
+    assert sorted(dests) == sorted(tmp_path.iterdir())
+    assert len(dests) == 12
+    assert dests[9] == tmp_path / "9.txt"
+    assert dests[9].read_bytes() == b"file 9"
+    assert dests[10].read_bytes() == b"0123456789" * 1000
+
+    # Attachments with the same name don't overwrite each other
+    assert {dests[0].name, dests[11].name} == {"0.txt", "0 (1).txt"}
+    assert dests[11].read_bytes() == b"last"
+
+    assert save_workflow_attachments([], tmp_path) == []
+
+
+def test_save_workflow_attachment_name_suffix(tmp_path):
+    for name in ("test.json", "test (1).json", "test (7).json", "test (8).txt", "other (9).json"):
+        (tmp_path / name).touch()
+
+    dest = save_workflow_attachment(FileStorage(stream=io.BytesIO(b"{}"), filename="test.json"), tmp_path)
+    assert dest == tmp_path / "test (8).json"
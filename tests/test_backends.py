@@ -0,0 +1,64 @@
+import os
+
+from pathlib import Path
+
+
+def test_get_workflow_name_wdl(app, tmp_path):
+    from bento_wes.backends.wes_backend import WESBackend
+
+    wdl_path = Path(os.path.dirname(__file__)) / "phenopackets_json.wdl"
+    assert WESBackend.get_workflow_name_wdl(wdl_path) == "phenopackets_json"
+
+    no_workflow_path = tmp_path / "empty.wdl"
+    no_workflow_path.write_bytes(b"version 1.0\n")
+    assert WESBackend.get_workflow_name_wdl(no_workflow_path) is None
+
+
+def test_wdl_import_regex(app):
+    from bento_wes.backends.wes_backend import WDL_IMPORT_REGEX
+
+    assert WDL_IMPORT_REGEX.search(b'version 1.0\nimport "other.wdl" as other\n')
+    assert WDL_IMPORT_REGEX.search(b'version 1.0\n  import "other.wdl"\n')
+    assert not WDL_IMPORT_REGEX.search(b"version 1.0\nworkflow imports_data {\n  String important = 'x'\n}\n")
+    assert not WDL_IMPORT_REGEX.search((Path(os.path.dirname(__file__)) / "phenopackets_json.wdl").read_bytes())
+
+
+def test_read_output_tail(app, tmp_path):
+    from bento_wes.backends.wes_backend import _read_output_tail
+
+    with open(tmp_path / "stdout.log", "w+b") as f:
+        f.write(b"hello")
+        f.flush()  # Output is normally written by the runner process directly to the underlying file
+        assert _read_output_tail(f, max_bytes=10) == "hello"
+
+        f.write("é world".encode("utf-8"))
+        f.flush()
+        # Cut-off multibyte character at the start of the tail is replaced
+        assert _read_output_tail(f, max_bytes=7) == "[6 bytes of earlier output omitted]\n� world"
+
+
+def test_initialize_run_invalid_workflow(app, client, mocked_responses, tmp_path):
+    from unittest.mock import MagicMock
+    from bento_wes import states
+    from bento_wes.backends.cromwell_local import CromwellLocalBackend
+    from bento_wes.backends.exceptions import RunExceptionWithFailState
+    from bento_wes.db import Database, get_db
+    from .test_runs import _add_workflow_response, _create_valid_run
+
+    _add_workflow_response(mocked_responses)
+    run_id = _create_valid_run(client)["run_id"]
+    run = Database.get_run_with_details(get_db().cursor(), run_id, stream_content=False)
+
+    backend = CromwellLocalBackend(
+        tmp_dir=tmp_path, data_dir=tmp_path / "data", workflow_timeout=60, logger=MagicMock(), event_bus=MagicMock())
+    backend.run_dir(run).mkdir()
+
+    backend._check_workflow_and_type = MagicMock(
+        side_effect=RunExceptionWithFailState(states.STATE_SYSTEM_ERROR, "Invalid workflow"))
+    backend._finish_run_and_clean_up = MagicMock(return_value=None)
+    backend.get_workflow_name = MagicMock()
+
+    # Once the run has been finished with an error state, initialization stops there
+    assert backend._initialize_run_and_get_command(run, celery_id=1, secrets={}) is None
+    backend._finish_run_and_clean_up.assert_called_once_with(run, states.STATE_SYSTEM_ERROR)
+    backend.get_workflow_name.assert_not_called()
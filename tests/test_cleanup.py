@@ -0,0 +1,23 @@
+import pytest
+import uuid
+
+
+def test_cleanup_run_dir(app, tmp_path, monkeypatch):
+    from bento_wes.cleanup import cleanup_run_dir
+
+    monkeypatch.setitem(app.config, "SERVICE_TEMP", tmp_path)
+
+    run_id = str(uuid.uuid4())
+    run_dir = tmp_path / run_id
+    (run_dir / "nested").mkdir(parents=True)
+    (run_dir / "nested" / "file.txt").write_text("test")
+
+    cleanup_run_dir(run_id)
+    assert not run_dir.exists()
+
+    # Non-existent directories are ignored
+    cleanup_run_dir(str(uuid.uuid4()))
+
+    # Only run IDs are accepted, not arbitrary paths
+    with pytest.raises(ValueError):
+        cleanup_run_dir("../something")
@@ -1,3 +1,5 @@
+import json
+import pytest
 from flask import g
 
 
@@ -18,3 +20,148 @@ def test_db(client):
 
     db.close_db(None)
     assert g.get("db", None) is None
+
+
+def test_db_migrate_run_id_columns(client, mocked_responses):
+    from bento_wes import db
+    from .constants import EXAMPLE_PROJECT_ID, EXAMPLE_DATASET_ID
+    from .test_runs import _add_workflow_response, _create_valid_run
+
+    _add_workflow_response(mocked_responses)
+    run_id = _create_valid_run(client)["run_id"]
+    bad_run_id = _create_valid_run(client)["run_id"]
+
+    database = db.get_db()
+    c = database.cursor()
+
+    # A historical run with a malformed project-dataset input value, which can't be split into project + dataset
+    c.execute(
+        "UPDATE runs SET request__workflow_params = ? WHERE id = ?",
+        (json.dumps({"phenopackets_json.project_dataset": "no-colon"}), bad_run_id))
+
+    # Simulate a database from before the ID columns existed
+    old_cols = ", ".join(
+        col["name"] for col in c.execute("PRAGMA table_info(runs)").fetchall()
+        if col["name"] not in ("project_id", "dataset_id", "workflow_id"))
+    c.execute(f"CREATE TABLE runs_old AS SELECT {old_cols} FROM runs")
+    c.execute("DROP TABLE runs")
+    c.execute("ALTER TABLE runs_old RENAME TO runs")
+    database.commit()
+
+    database.migrate()
+    database.create_indices()
+
+    r = c.execute("SELECT project_id, dataset_id, workflow_id FROM runs WHERE id = ?", (run_id,)).fetchone()
+    assert tuple(r) == (EXAMPLE_PROJECT_ID, EXAMPLE_DATASET_ID, "phenopackets_json")
+
+    # The malformed run doesn't stop the migration; its new columns are just left empty
+    r = c.execute("SELECT project_id, dataset_id, workflow_id FROM runs WHERE id = ?", (bad_run_id,)).fetchone()
+    assert tuple(r) == (None, None, None)
+
+
+def test_db_read_only(app, tmp_path, monkeypatch):
+    import sqlite3
+    from bento_wes import db
+
+    # In-memory databases can't be shared between connections, so the normal connection is re-used
+    assert db.get_ro_db() is db.get_db()
+    db.close_db(None)
+
+    monkeypatch.setitem(app.config, "DATABASE", tmp_path / "bento_wes.db")
+    db.init_db()
+
+    assert db.get_db().cursor().execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+
+    ro_db = db.get_ro_db()
+    assert ro_db is not db.get_db()
+    assert ro_db.cursor().execute("SELECT COUNT(*) FROM runs").fetchone()[0] == 0
+
+    with pytest.raises(sqlite3.OperationalError):
+        ro_db.cursor().execute("DELETE FROM runs")
+
+    db.close_db(None)
+    assert g.get("db", None) is None
+    assert g.get("ro_db", None) is None
+
+
+def test_db_update_run_state(client, mocked_responses):
+    from unittest.mock import MagicMock
+    from bento_wes import db, states
+    from .test_runs import _add_workflow_response, _create_valid_run
+
+    _add_workflow_response(mocked_responses)
+    run_id = _create_valid_run(client)["run_id"]
+
+    database = db.get_db()
+    c = database.cursor()
+    event_bus = MagicMock()
+
+    database.update_run_state_and_commit(c, run_id, states.STATE_INITIALIZING, event_bus=event_bus)
+    assert event_bus.publish_service_event.call_count == 1
+
+    # No change - nothing to commit or publish
+    database.update_run_state_and_commit(c, run_id, states.STATE_INITIALIZING, event_bus=event_bus)
+    assert event_bus.publish_service_event.call_count == 1
+
+    # No state change, but other writes pending - still committed and published
+    c.execute("UPDATE runs SET run_log__cmd = 'cmd' WHERE id = ?", (run_id,))
+    database.update_run_state_and_commit(c, run_id, states.STATE_INITIALIZING, event_bus=event_bus)
+    assert event_bus.publish_service_event.call_count == 2
+    assert not database._conn.in_transaction
+
+
+def test_db_pool(app, tmp_path, monkeypatch):
+    from bento_wes import db
+
+    db.close_db(None)
+    monkeypatch.setitem(app.config, "DATABASE", tmp_path / "bento_wes.db")
+    monkeypatch.setitem(app.config, "DATABASE_POOL_SIZE", 1)
+    db.init_db()
+
+    # Connections are returned to the pool at the end of the app context, and re-used
+    database = db.get_db()
+    ro_database = db.get_ro_db()
+    db.close_db(None)
+    assert db.get_db() is database
+    assert db.get_ro_db() is ro_database
+
+    # ... without any uncommitted changes
+    database.cursor().execute("UPDATE runs SET state = 'x'")
+    db.close_db(None)
+    assert not db.get_db()._conn.in_transaction
+
+    # Only up to DATABASE_POOL_SIZE idle connections are kept
+    with app.app_context():
+        other_database = db.get_db()  # Pool is empty, so this is a new connection
+    assert other_database is not database
+    db.close_db(None)
+    with app.app_context():
+        assert db.get_db() is other_database
+
+
+def test_db_task_logs_for_runs(client):
+    from bento_wes import db
+
+    c = db.get_db().cursor()
+    c.execute(
+        "INSERT INTO task_logs (id, run_id, name, cmd, start_time, end_time, stdout, stderr, exit_code) "
+        "VALUES ('t1', 'r1', 'task', 'cmd', '', '', '', '', 0)")
+
+    task_logs = db.Database.get_task_logs_for_runs(c, ["r1", "r2"])
+    assert tuple(sorted(task_logs.keys())) == ("r1", "r2")
+    assert len(task_logs["r1"]) == 1 and task_logs["r1"][0]["name"] == "task"
+    assert task_logs["r2"] == []
+    assert task_logs["r1"] == db.Database.get_task_logs(c, "r1")
+
+    assert db.Database.get_task_logs_for_runs(c, []) == {}
+
+
+def test_db_update_indices(client):
+    from bento_wes import db
+
+    # Existing database - indices are (re-)created and statistics refreshed
+    db.update_db()
+
+    c = db.get_db().cursor()
+    plan = c.execute(f"EXPLAIN QUERY PLAN SELECT {db.TASK_LOG_COLUMNS} FROM task_logs WHERE run_id = ?", ("r1",))
+    assert any("task_logs_run_id_idx" in row["detail"] for row in plan.fetchall())
@@ -0,0 +1,37 @@
+import pytest
+import responses
+
+from bento_wes import http_session
+
+
+def test_get_http_session():
+    session = http_session.get_http_session()
+    assert http_session.get_http_session() is session  # Shared
+
+    http_session._close_http_session()
+    assert http_session.get_http_session() is not session  # Re-created after being closed
+
+
+def test_http_session_retry():
+    from urllib3.exceptions import ConnectTimeoutError, MaxRetryError, ReadTimeoutError
+
+    retry = http_session.HTTP_SESSION_RETRY
+
+    # Connection errors are retried, but read timeouts (i.e., a hung server) are not
+    assert retry.increment(method="GET", url="/", error=ConnectTimeoutError()).total == 2
+    with pytest.raises(MaxRetryError):
+        retry.increment(method="GET", url="/", error=ReadTimeoutError(None, "/", "timed out"))
+
+
+def test_http_session_no_cookies(mocked_responses):
+    url = "http://example.org/workflow.wdl"
+    mocked_responses.add(responses.GET, url, body="version 1.0", headers={"Set-Cookie": "session=user1; Path=/"})
+    mocked_responses.add(responses.GET, url, body="version 1.0")
+
+    session = http_session.get_http_session()
+    session.get(url)
+    session.get(url)
+
+    # The cookie set in response to the first request isn't kept, so it isn't sent with the second
+    assert len(session.cookies) == 0
+    assert "Cookie" not in mocked_responses.calls[1].request.headers
@@ -0,0 +1,30 @@
+import json
+import pydantic_core
+import pytest
+
+from datetime import datetime, timezone
+
+
+def test_json_provider_dumps(app):
+    provider = app.json
+
+    obj = {"b": 1, "a": "é", "c": datetime(2024, 1, 2, 3, 4, 5, tzinfo=timezone.utc)}
+
+    # Datetimes are rendered as ISO 8601 (where Flask's default provider uses HTTP dates); keys stay in order
+    assert provider.dumps(obj) == '{"b":1,"a":"é","c":"2024-01-02T03:04:05Z"}'
+    assert provider.dumps(obj, separators=(",", ":")) == provider.dumps(obj)
+    assert provider.dumps([1, {"a": None}], indent=2) == json.dumps([1, {"a": None}], indent=2)
+
+    # Options pydantic-core can't handle itself are honoured via the standard library, with the same conversions
+    assert provider.dumps(obj, sort_keys=True) == '{"a": "é", "b": 1, "c": "2024-01-02T03:04:05Z"}'
+    assert provider.dumps({"a": "é"}, ensure_ascii=True) == '{"a": "\\u00e9"}'
+    assert provider.dumps({"a": 1}, separators=(", ", ": ")) == '{"a": 1}'
+
+    class Thing:
+        pass
+
+    assert provider.dumps({"a": Thing()}, default=lambda _: "thing") == '{"a":"thing"}'
+    with pytest.raises(pydantic_core.PydanticSerializationError):
+        provider.dumps({"a": Thing()})
+    with pytest.raises(TypeError):
+        provider.dumps({}, not_a_json_option=True)
@@ -1,9 +1,10 @@
 import json
 import os
+import pytest
 import responses
 import uuid
 
-from .constants import EXAMPLE_RUN, EXAMPLE_RUN_BODY
+from .constants import EXAMPLE_DATASET_ID, EXAMPLE_PROJECT_ID, EXAMPLE_RUN, EXAMPLE_RUN_BODY
 
 from bento_wes.states import STATE_QUEUED, STATE_COMPLETE
 
@@ -77,6 +78,20 @@ def test_run_create_errors(client):
     error = rv.get_json()
     assert len(error["errors"]) == 1
     assert error["errors"][0]["message"].startswith("Validation error")
+    assert error["errors"][0]["message"].endswith("missing run request fields: workflow_params")
+
+
+def test_run_create_workflow_download_error(app, client, mocked_responses, tmp_path, monkeypatch):
+    monkeypatch.setitem(app.config, "SERVICE_TEMP", tmp_path)
+
+    mocked_responses.add(responses.GET, EXAMPLE_RUN["workflow_url"], status=404)
+
+    rv = client.post("/runs", data=EXAMPLE_RUN_BODY)
+    assert rv.status_code == 400
+    assert rv.get_json()["errors"][0]["message"].startswith("Could not access workflow file")
+
+    # The run directory is removed again
+    assert not any(p.is_dir() for p in tmp_path.iterdir())
 
 
 def test_run_detail_endpoint(client, mocked_responses):
@@ -122,6 +137,18 @@ def test_run_status_endpoint(client, mocked_responses):
     assert rv.status_code == 200
     assert json.dumps(rv.get_json(), sort_keys=True) == json.dumps({**cr_data, "state": STATE_QUEUED}, sort_keys=True)
 
+    from bento_wes.db import get_db
+    db = get_db()
+
+    # Terminal statuses are cached, since they can no longer change
+    db.cursor().execute("UPDATE runs SET state = ? WHERE id = ?", (STATE_COMPLETE, cr_data["run_id"]))
+    db.commit()
+    assert client.get(f"/runs/{cr_data['run_id']}/status").get_json()["state"] == STATE_COMPLETE
+
+    db.cursor().execute("UPDATE runs SET state = ? WHERE id = ?", (STATE_QUEUED, cr_data["run_id"]))
+    db.commit()
+    assert client.get(f"/runs/{cr_data['run_id']}/status").get_json()["state"] == STATE_COMPLETE
+
 
 def test_run_streams(client, mocked_responses):
     _add_workflow_response(mocked_responses)
@@ -142,8 +169,28 @@ def test_run_streams(client, mocked_responses):
     assert rv.status_code == 200
     assert rv.data == b""
 
+    from bento_wes.db import get_db
+    db = get_db()
+    db.cursor().execute(
+        "UPDATE runs SET run_log__stdout = 'out', run_log__stderr = 'err' WHERE id = ?", (cr_data["run_id"],))
+    db.commit()
+
+    assert client.get(f"/runs/{cr_data['run_id']}/stdout").data == b"out"
+    assert client.get(f"/runs/{cr_data['run_id']}/stderr").data == b"err"
+
+    # Larger than a single chunk, and not ASCII-only
+    from bento_wes.db import RUN_STREAM_CHUNK_SIZE
+    long_stdout = "é" * RUN_STREAM_CHUNK_SIZE
+    db.cursor().execute("UPDATE runs SET run_log__stdout = ? WHERE id = ?", (long_stdout, cr_data["run_id"]))
+    db.commit()
+
+    assert client.get(f"/runs/{cr_data['run_id']}/stdout").data == long_stdout.encode("utf-8")
+
+
+def test_run_cancel_endpoint(client, mocked_responses, monkeypatch):
+    from unittest.mock import MagicMock
+    from bento_wes import runs
 
-def test_run_cancel_endpoint(client, mocked_responses):
     _add_workflow_response(mocked_responses)
 
     cr_data = _create_valid_run(client)
@@ -157,17 +204,27 @@ def test_run_cancel_endpoint(client, mocked_responses):
     assert len(error["errors"]) == 1
     assert error["errors"][0]["message"].startswith("No Celery ID present")
 
-    # TODO: Get celery running for tests
+    # Once the runner has recorded its Celery task ID, the task is revoked and the run canceled
+    from bento_wes.db import get_db
+    db = get_db()
+    db.cursor().execute(
+        "UPDATE runs SET run_log__celery_id = 'celery-task-id' WHERE id = ?", (cr_data["run_id"],))
+    db.commit()
+
+    control = MagicMock()
+    monkeypatch.setattr(runs.celery, "control", control)
+    monkeypatch.setattr(runs, "cleanup_run_dir", MagicMock())
+    monkeypatch.setattr(runs, "get_flask_event_bus", MagicMock())
+
+    rv = client.post(f"/runs/{cr_data['run_id']}/cancel")
+    assert rv.status_code == 204
+    control.revoke.assert_called_once_with("celery-task-id", terminate=True)
 
-    # rv = client.post(f"/runs/{cr_data['run_id']}/cancel")
-    # print(rv.get_json(), flush=True)
-    # assert rv.status_code == 204
-    #
-    # rv = client.post(f"/runs/{cr_data['run_id']}/cancel")
-    # assert rv.status_code == 400
-    # error = rv.get_json()
-    # assert len(error["errors"]) == 1
-    # assert error["errors"][0]["message"] == "Run already canceled"
+    rv = client.post(f"/runs/{cr_data['run_id']}/cancel")
+    assert rv.status_code == 400
+    error = rv.get_json()
+    assert len(error["errors"]) == 1
+    assert error["errors"][0]["message"] == "Run already canceled"
 
 
 def test_runs_public_endpoint(client, mocked_responses):
@@ -211,3 +268,172 @@ def test_runs_public_endpoint(client, mocked_responses):
         assert set(metadata.keys()) == set(expected_metadata_keys)
         run_log = details["run_log"]
         assert set(run_log.keys()) == set(expected_run_log_keys)
+
+
+def test_runs_endpoint_pagination_and_filters(client, mocked_responses):
+    _add_workflow_response(mocked_responses)
+
+    run_ids = [_create_valid_run(client)["run_id"] for _ in range(3)]
+
+    rv = client.get("/runs?limit=2")
+    assert rv.status_code == 200
+    assert [r["run_id"] for r in rv.get_json()] == run_ids[:2]
+
+    rv = client.get("/runs?limit=2&offset=2")
+    assert rv.status_code == 200
+    assert [r["run_id"] for r in rv.get_json()] == run_ids[2:]
+
+    rv = client.get("/runs?offset=1")
+    assert rv.status_code == 200
+    assert [r["run_id"] for r in rv.get_json()] == run_ids[1:]
+
+    rv = client.get(f"/runs?state={STATE_QUEUED}")
+    assert rv.status_code == 200
+    assert len(rv.get_json()) == 3
+
+    rv = client.get(f"/runs?state={STATE_COMPLETE}")
+    assert rv.status_code == 200
+    assert rv.get_json() == []
+
+    rv = client.get(f"/runs?project={EXAMPLE_PROJECT_ID}&dataset={EXAMPLE_DATASET_ID}")
+    assert rv.status_code == 200
+    assert len(rv.get_json()) == 3
+
+    rv = client.get(f"/runs?project={uuid.uuid4()}")
+    assert rv.status_code == 200
+    assert rv.get_json() == []
+
+    rv = client.get("/runs?limit=-1")
+    assert rv.status_code == 400
+
+    rv = client.get("/runs?offset=abc")
+    assert rv.status_code == 400
+
+
+def test_runs_endpoint_batches(client, mocked_responses, monkeypatch):
+    from bento_wes import runs
+
+    _add_workflow_response(mocked_responses)
+    monkeypatch.setattr(runs, "RUN_LIST_BATCH_SIZE", 2)
+
+    run_ids = [_create_valid_run(client)["run_id"] for _ in range(5)]
+
+    rv = client.get("/runs?with_details=true")
+    assert rv.status_code == 200
+    data = rv.get_json()
+    assert [r["run_id"] for r in data] == run_ids
+    assert all(r["details"]["run_id"] == r["run_id"] for r in data)
+
+
+def test_runs_endpoint_authz_error(app, client, mocked_responses, monkeypatch):
+    from bento_wes.authz import authz_middleware
+
+    _add_workflow_response(mocked_responses)
+    _create_valid_run(client)
+
+    def _evaluate_error(*_args, **_kwargs):
+        raise Exception("authz service unavailable")
+
+    monkeypatch.setitem(app.config, "AUTHZ_ENABLED", True)
+    monkeypatch.setattr(authz_middleware, "evaluate", _evaluate_error)
+
+    # Permissions are checked before responding, so the error is raised while handling the request, rather than
+    # part-way through streaming a run list which has already been sent with a 200 status
+    with pytest.raises(Exception):
+        client.get("/runs")
+
+
+def test_runs_endpoint_pagination_with_authz(app, client, mocked_responses, monkeypatch):
+    from bento_wes.authz import authz_middleware
+    from bento_wes.db import get_db
+
+    _add_workflow_response(mocked_responses)
+    run_ids = [_create_valid_run(client)["run_id"] for _ in range(3)]
+
+    db = get_db()
+    db.cursor().execute("UPDATE runs SET project_id = 'hidden' WHERE id = ?", (run_ids[0],))
+    db.commit()
+
+    evaluated_resources = []
+
+    def _evaluate(_request, resources, _permissions, **_kwargs):
+        evaluated_resources.extend(resources)
+        return [[r.get("project") != "hidden"] for r in resources]
+
+    monkeypatch.setitem(app.config, "AUTHZ_ENABLED", True)
+    monkeypatch.setattr(authz_middleware, "evaluate", _evaluate)
+
+    # Pagination applies to visible runs only, so pages are never short (or empty) while more visible runs remain
+    rv = client.get("/runs?limit=1")
+    assert rv.status_code == 200
+    assert [r["run_id"] for r in rv.get_json()] == run_ids[1:2]
+
+    rv = client.get("/runs?limit=1&offset=1")
+    assert rv.status_code == 200
+    assert [r["run_id"] for r in rv.get_json()] == run_ids[2:]
+
+    rv = client.get("/runs?limit=1&offset=2")
+    assert rv.status_code == 200
+    assert rv.get_json() == []
+
+    # Permissions are evaluated once per distinct resource, rather than once per run
+    assert len(evaluated_resources) == 2 * 3
+
+    # No visible resources
+    monkeypatch.setattr(authz_middleware, "evaluate", lambda _r, resources, _p, **_kw: [[False] for _ in resources])
+    assert client.get("/runs").get_json() == []
+
+
+def test_runs_endpoint_many_resources_with_authz(app, client, mocked_responses, monkeypatch):
+    from bento_wes.authz import authz_middleware
+    from bento_wes.db import get_db
+
+    _add_workflow_response(mocked_responses)
+    run_id = _create_valid_run(client)["run_id"]
+
+    # Copy the run into many different projects - more visible resources than SQLite's (older) limit of 999 bound
+    # parameters, if each resource needed a parameter per column
+    db = get_db()
+    c = db.cursor()
+    columns = [r[1] for r in c.execute("PRAGMA table_info(runs)")]
+    copied = ", ".join("?" if col in ("id", "project_id") else col for col in columns)
+    c.executemany(
+        f"INSERT INTO runs ({', '.join(columns)}) SELECT {copied} FROM runs WHERE id = ?",
+        [(f"run-{i}", f"project-{i}", run_id) for i in range(1000)])  # id comes before project_id
+    # ... and leave the original run without a project or dataset, which must still be matched despite NULL IDs
+    c.execute("UPDATE runs SET project_id = NULL, dataset_id = NULL WHERE id = ?", (run_id,))
+    db.commit()
+
+    monkeypatch.setitem(app.config, "AUTHZ_ENABLED", True)
+
+    def _evaluate(_request, resources, _permissions, **_kwargs):
+        return [[not r.get("project") or int(r["project"].split("-")[1]) % 2 == 0] for r in resources]
+
+    monkeypatch.setattr(authz_middleware, "evaluate", _evaluate)
+
+    rv = client.get("/runs")
+    assert rv.status_code == 200
+    assert [r["run_id"] for r in rv.get_json()] == [run_id, *(f"run-{i}" for i in range(0, 1000, 2))]
+
+
+def test_runs_endpoint_corrupt_run(client, mocked_responses):
+    from bento_wes.db import get_db
+
+    _add_workflow_response(mocked_responses)
+    run_ids = [_create_valid_run(client)["run_id"] for _ in range(2)]
+
+    db = get_db()
+    db.cursor().execute("UPDATE runs SET request__tags = 'not JSON' WHERE id = ?", (run_ids[1],))
+    db.commit()
+
+    # The response has already started by the time the corrupt run is reached, but the body is still valid JSON,
+    # ending with an error marker rather than being cut off
+    rv = client.get("/runs")
+    assert rv.status_code == 200
+    data = rv.get_json()
+    assert [r["run_id"] for r in data[:-1]] == run_ids[:1]
+    assert "error" in data[-1]
+
+    # If the first run is corrupt, the error happens before the response starts
+    with pytest.raises(Exception):
+        client.get("/runs?offset=1")
@@ -7,3 +7,8 @@ def test_service_info(client):
     data = rv.get_json()
 
     validate(data, bento_lib.schemas.ga4gh.SERVICE_INFO_SCHEMA)
+
+    # Built once, then served from the cache
+    rv2 = client.get("/service-info")
+    assert rv2.get_json() == data
+    assert rv2.mimetype == "application/json"
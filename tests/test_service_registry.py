@@ -0,0 +1,24 @@
+import responses
+
+from bento_wes import service_registry
+
+
+def test_get_bento_service_url(app, mocked_responses, monkeypatch):
+    monkeypatch.setattr(service_registry, "_bento_services_cache", None)
+    monkeypatch.setattr(service_registry, "_bento_services_last_updated", None)
+
+    mocked_responses.add(
+        responses.GET,
+        "http://bento-sr.local/bento-services",
+        json={
+            "drop-box": {"service_kind": "drop-box", "url": "http://drop-box.local"},
+            "no-url": {"service_kind": "no-url"},
+        },
+    )
+
+    assert service_registry.get_bento_service_url("drop-box") == "http://drop-box.local"
+    assert service_registry.get_bento_service_url("no-url") is None
+    assert service_registry.get_bento_service_url("missing") is None
+
+    # Service registry data is cached
+    assert len(mocked_responses.calls) == 1
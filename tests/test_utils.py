@@ -0,0 +1,23 @@
+import re
+
+from datetime import datetime, timezone
+
+from bento_wes import utils
+
+
+def test_iso_now():
+    before = datetime.now(timezone.utc).replace(microsecond=0)
+    now = utils.iso_now()
+    after = datetime.now(timezone.utc)
+
+    assert re.fullmatch(r"\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}Z", now)
+    assert before <= datetime.strptime(now, "%Y-%m-%dT%H:%M:%SZ").replace(tzinfo=timezone.utc) <= after
+
+
+def test_iso_now_cache(monkeypatch):
+    monkeypatch.setattr(utils.time, "time", lambda: 1700000000.25)
+    assert utils.iso_now() == "2023-11-14T22:13:20Z"
+    monkeypatch.setattr(utils.time, "time", lambda: 1700000000.75)
+    assert utils.iso_now() == "2023-11-14T22:13:20Z"
+    monkeypatch.setattr(utils.time, "time", lambda: 1700000001.0)
+    assert utils.iso_now() == "2023-11-14T22:13:21Z"